@@ -4,8 +4,8 @@ import constants
 
 
 class Ai(player.Player):
-    def __init__(self, name, start_x, start_y, color, difficulty):
-        super(Ai, self).__init__(name, start_x, start_y, color)
+    def __init__(self, name, start_x, start_y, color, difficulty, rng=random):
+        super(Ai, self).__init__(name, start_x, start_y, color, rng)
         self.difficulty = difficulty
         self.set_speed()
         self.frame = 0
@@ -13,7 +13,7 @@ class Ai(player.Player):
         self.min_collision_distance = 100 // self.difficulty
         self.is_ai = True
 
-    def run_ai_logic(self, grid):
+    def run_ai_logic(self, grid, players=()):
         """Make decisions based on nearby collision. Frame delay equates to reflexes."""
         self.increment_frames()
         if self.frame >= self.frame_delay and self.is_near_collision(grid):
@@ -40,44 +40,145 @@ class Ai(player.Player):
     def determine_turn(self, grid):
         """Get flanking distances to collision. Whichever direction has the longest distance to a collision, turn that direction."""
         x, y = grid.get_grid_coord(self.xcor(), self.ycor())
-        i = 1
-        while True:
-            if self.heading() == constants.EAST or self.heading() == constants.WEST:
-                if self.is_collision(grid, x, y + i):
-                    return constants.SOUTH
-                elif self.is_collision(grid, x, y - i):
-                    return constants.NORTH
-            elif self.heading() == constants.NORTH or self.heading() == constants.SOUTH:
-                if self.is_collision(grid, x - i, y):
-                    return constants.EAST
-                elif self.is_collision(grid, x + i, y):
-                    return constants.WEST
-            i += 1
+        heading = self.heading()
+        if heading == constants.EAST or heading == constants.WEST:
+            north = grid.raycast(x, y, constants.NORTH)
+            south = grid.raycast(x, y, constants.SOUTH)
+            return constants.SOUTH if north <= south else constants.NORTH
+        else:
+            west = grid.raycast(x, y, constants.WEST)
+            east = grid.raycast(x, y, constants.EAST)
+            return constants.EAST if west <= east else constants.WEST
 
     def is_near_collision(self, grid):
         """Checks for nearby collision in the direction of the player."""
-        i = 1
         x, y = grid.get_grid_coord(self.xcor(), self.ycor())
-        while i <= self.min_collision_distance:
-            if (
-                (self.heading() == constants.EAST and self.is_collision(grid, x + i, y))
-                or (
-                    self.heading() == constants.WEST
-                    and self.is_collision(grid, x - i, y)
-                )
-                or (
-                    self.heading() == constants.NORTH
-                    and self.is_collision(grid, x, y + i)
-                )
-                or (
-                    self.heading() == constants.SOUTH
-                    and self.is_collision(grid, x, y - i)
-                )
-            ):
-                return True
-            i += 1
-        return False
+        distance = grid.raycast(x, y, self.heading(), self.min_collision_distance)
+        return distance <= self.min_collision_distance
 
     def respawn(self, x, y):
         super(Ai, self).respawn(x, y)
         self.set_speed()
+
+
+class SpaceAi(Ai):
+    """Fourth difficulty tier. Scores each move by the territory it would claim: the
+    cells this bot reaches before any opponent, found with a breadth first search over
+    a coarse copy of the grid. Each search stops after node_limit cells. The engine
+    splits tick_nodes between the Expert bots every tick, so together they stay within
+    about 4 ms, half a tick, however many there are. Limits count cells, not time, so a
+    seed replays the same match."""
+
+    stride = 10
+    tick_nodes = 1200
+    node_limit = tick_nodes
+
+    def share_search_budget(self, bots):
+        """Takes this bot's part of tick_nodes when bots Expert bots are riding."""
+        self.node_limit = max(self.tick_nodes // bots, 1)
+
+    def set_speed(self, speed=0):
+        """Same top speed as the Hard tier."""
+        self.fwd_speed = speed or 3
+
+    def run_ai_logic(self, grid, players=()):
+        """Re-plan every frame_delay frames, or straight away if a wall is close."""
+        self.increment_frames()
+        x, y = grid.get_grid_coord(self.xcor(), self.ycor())
+        # Grids without a ray index stop counting at the limit, so it has to reach past
+        # the distance that triggers a re-plan
+        near = self.fwd_speed * 2
+        ahead = grid.raycast(x, y, self.heading(), max(self.stride, near))
+        if self.frame >= self.frame_delay or ahead <= near:
+            dir = self.choose_direction(grid, players, x, y)
+            if dir != self.heading():
+                self.go_dir(dir)
+            self.reset_frames()
+
+    def choose_direction(self, grid, players, x, y):
+        """Returns the heading with the most territory. Keeps going straight on ties."""
+        cells, width, height, x0, y0 = grid.sample(x, y, self.stride)
+        here = (y - y0) // self.stride * width + (x - x0) // self.stride
+        cells[here] = 1
+
+        opponents = []
+        for other in players:
+            if other is not self and other.status == other.READY:
+                ox, oy = grid.get_grid_coord(other.xcor(), other.ycor())
+                col = min(max((ox - x0 + self.stride // 2) // self.stride, 0), width - 1)
+                row = min(max((oy - y0 + self.stride // 2) // self.stride, 0), height - 1)
+                opponents.append(row * width + col)
+        theirs = self.distances(cells, width, opponents)
+
+        heading = self.heading()
+        best_dir, best_score = heading, None
+        for dir in (heading, (heading + 90) % 360, (heading - 90) % 360):
+            if grid.raycast(x, y, dir, self.stride) <= self.stride:
+                continue
+            dx, dy = constants.DELTAS[dir]
+            start = here + dx + dy * width
+            score = self.territory(cells, width, start, theirs)
+            if best_score is None or score > best_score:
+                best_dir, best_score = dir, score
+        if best_score is None:
+            # Boxed in on every side, fall back on the reactive turn
+            return self.determine_turn(grid)
+        return best_dir
+
+    def distances(self, cells, width, sources):
+        """Breadth first search from sources. Returns {cell: steps} for reached cells."""
+        dist = {source: 0 for source in sources}
+        frontier = list(sources)
+        size = len(cells)
+        steps = 0
+        while frontier and len(dist) < self.node_limit:
+            steps += 1
+            next_frontier = []
+            for idx in frontier:
+                col = idx % width
+                for n in (
+                    idx - 1 if col > 0 else -1,
+                    idx + 1 if col < width - 1 else -1,
+                    idx - width,
+                    idx + width,
+                ):
+                    if 0 <= n < size and not cells[n] and n not in dist:
+                        dist[n] = steps
+                        next_frontier.append(n)
+            frontier = next_frontier
+        return dist
+
+    def territory(self, cells, width, start, theirs):
+        """Counts cells reachable from start strictly before any opponent. Cells reached
+        at the same time count half."""
+        if cells[start]:
+            return 0
+        seen = {start}
+        frontier = [start]
+        size = len(cells)
+        score = 0
+        steps = 0
+        while frontier and len(seen) < self.node_limit:
+            next_frontier = []
+            for idx in frontier:
+                other = theirs.get(idx)
+                if other is None or steps < other:
+                    score += 1
+                elif steps == other:
+                    score += 0.5
+                    continue
+                else:
+                    continue
+                col = idx % width
+                for n in (
+                    idx - 1 if col > 0 else -1,
+                    idx + 1 if col < width - 1 else -1,
+                    idx - width,
+                    idx + width,
+                ):
+                    if 0 <= n < size and not cells[n] and n not in seen:
+                        seen.add(n)
+                        next_frontier.append(n)
+            frontier = next_frontier
+            steps += 1
+        return score
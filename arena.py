@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""Load tests the engine on huge arenas with hundreds of bots.
+
+    $ python3 arena.py --size 10000 --bots 500 --ticks 2000
+
+The arena is backed by a SparseGrid, so only the parts with trails use memory, or
+with --segments by a SegmentGrid, which stores one interval per row or column a
+straight run covers. A crash respawns just the crashed cycle and leaves every trail in
+place, so the cost of a tick follows the number of cycles still riding rather than the
+size of the arena.
+
+    $ python3 arena.py --check_segments --ticks 3000
+
+checks that SegmentGrid is a drop-in replacement instead: the same seeded match on a
+cell Grid and on a SegmentGrid must end the same way, for every difficulty.
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+
+from engine import Engine
+from grid import SegmentGrid, SparseGrid
+from mcts import MctsAi
+
+# Playouts per MctsAi search in check_segments, so its matches replay exactly
+CHECK_PLAYOUTS = 50
+
+
+class ArenaEngine(Engine):
+    """Engine for arenas of any size. Every crash in a tick is handled, not only the
+    first, and a crashed cycle that has lives left respawns on its own."""
+
+    # Search bots would sample or scan huge arenas every decision
+    max_difficulty = 3
+
+    def __init__(
+        self,
+        size=10000,
+        bots=500,
+        difficulty=1,
+        seed=None,
+        segments=False,
+        simultaneous=False,
+    ):
+        self.size = size
+        super().__init__(
+            humans=0,
+            bots=bots,
+            difficulty=min(difficulty, self.max_difficulty),
+            seed=seed,
+            segments=segments,
+            simultaneous=simultaneous,
+        )
+
+    def determine_grid_size(self, grid_size):
+        # The engine takes out_of_bounds_length (50) off each side
+        self.width = self.size + 100
+        self.height = self.size + 100
+
+    def create_grid(self):
+        if self.segments:
+            return SegmentGrid(self.x_boundary * 2, self.y_boundary * 2)
+        return SparseGrid(self.x_boundary * 2, self.y_boundary * 2)
+
+    def is_game_over(self):
+        return len([p for p in self.players if p.status != p.DEAD]) <= 1
+
+    def handle_crashes(self):
+        """Every crash counts, and each crashed cycle respawns on its own."""
+        self.crashed = [
+            player for player in self.players if player.status == player.CRASHED
+        ]
+        for player in self.crashed:
+            player.lose_life()
+            if player.status != player.DEAD:
+                self.respawn(player)
+        if self.crashed and self.is_game_over():
+            self.game_on = False
+
+
+def play_check_match(difficulty, seed, ticks, segments):
+    """Returns the tick, lives and crash positions a seeded bot match ends with."""
+    engine = Engine(
+        grid_size=2, humans=0, bots=3, difficulty=difficulty, seed=seed, segments=segments
+    )
+    for player in engine.players:
+        if isinstance(player, MctsAi):
+            player.playouts = CHECK_PLAYOUTS
+    crashes = []
+    while engine.game_on and engine.tick < ticks:
+        engine.step()
+        crashes += [player.crash_pos for player in engine.crashed]
+    return engine.tick, [player.lives for player in engine.players], crashes
+
+
+def check_segments(seed, ticks, difficulties=range(1, 6)):
+    """Plays the same match on a Grid and on a SegmentGrid for every difficulty.
+    Returns the difficulties where they differ."""
+    return [
+        difficulty
+        for difficulty in difficulties
+        if play_check_match(difficulty, seed, ticks, False)
+        != play_check_match(difficulty, seed, ticks, True)
+    ]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=10000, help="arena width in cells")
+    parser.add_argument("--bots", type=int, default=500)
+    parser.add_argument("--difficulty", type=int, default=1, choices=[1, 2, 3])
+    parser.add_argument("--ticks", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--segments", action="store_true", help="store trails as segments, not tiles"
+    )
+    parser.add_argument(
+        "--simultaneous",
+        action="store_true",
+        help="move every cycle at once, so head-on crashes crash both",
+    )
+    parser.add_argument(
+        "--memory", action="store_true", help="trace peak memory, runs slower"
+    )
+    parser.add_argument(
+        "--check_segments",
+        action="store_true",
+        help="check that SegmentGrid plays out like Grid for every difficulty",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.check_segments:
+        differ = check_segments(args.seed, args.ticks)
+        if differ:
+            sys.exit(f"SegmentGrid differs from Grid for difficulties {differ}")
+        print(f"SegmentGrid matches Grid for every difficulty over {args.ticks} ticks")
+        return
+    if args.memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    engine = ArenaEngine(
+        args.size,
+        args.bots,
+        args.difficulty,
+        args.seed,
+        args.segments,
+        args.simultaneous,
+    )
+    setup = time.perf_counter() - start
+
+    crashes = 0
+    riding = []
+    start = time.perf_counter()
+    while engine.game_on and engine.tick < args.ticks:
+        riding.append(len([p for p in engine.players if p.status == p.READY]))
+        engine.step()
+        crashes += len(engine.crashed)
+    elapsed = time.perf_counter() - start
+
+    alive = len([p for p in engine.players if p.status != p.DEAD])
+    area = engine.grid.width * engine.grid.height
+    print(f"arena {engine.grid.width}x{engine.grid.height}, {args.bots} bots")
+    print(f"setup {setup * 1000:.0f} ms, {engine.tick} ticks in {elapsed:.1f} s")
+    print(f"{engine.tick / elapsed:.1f} ticks/s, {sum(riding) / elapsed:.0f} cycle moves/s")
+    print(f"{crashes} crashes, {alive} cycles alive")
+    if args.segments:
+        lines = len(engine.grid.rows) + len(engine.grid.cols)
+        print(f"{lines} rows and columns hold intervals")
+    else:
+        used = len(engine.grid.tiles) * engine.grid.TILE**2
+        print(f"{len(engine.grid.tiles)} tiles, {100 * used / area:.2f}% of the arena")
+    if args.memory:
+        _, peak = tracemalloc.get_traced_memory()
+        print(f"peak memory {peak / 2**20:.1f} MB")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,51 @@
+import time
+import tkinter
+
+
+class AssetCache:
+    """Decodes every image once and keeps the PhotoImage for the rest of the session.
+    Backgrounds are drawn with our own canvas image item, so changing the background
+    only swaps the image on that item. screen.clear deletes the item, it is recreated
+    on the next call with the image already decoded."""
+
+    def __init__(self, screen):
+        self.screen = screen
+        self.canvas = screen.getcanvas()
+        self.images = {}
+        self.background_item = None
+        self.decode_time = 0
+
+    def image(self, path):
+        if path not in self.images:
+            start = time.perf_counter()
+            self.images[path] = tkinter.PhotoImage(file=path, master=self.canvas)
+            self.decode_time += time.perf_counter() - start
+        return self.images[path]
+
+    def set_background(self, path):
+        """Shows the image at path centered behind everything else on the canvas."""
+        image = self.image(path)
+        if self.background_item not in self.canvas.find_all():
+            self.background_item = self.canvas.create_image(0, 0, image=image)
+        else:
+            self.canvas.itemconfigure(self.background_item, image=image)
+        self.canvas.tag_lower(self.background_item)
+
+
+class StartupTimer:
+    """Records how long startup steps take, measured from when it was created."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.marks = []
+
+    def mark(self, name):
+        self.marks.append((name, time.perf_counter() - self.start))
+
+    def elapsed(self, first, last):
+        marks = dict(self.marks)
+        return marks[last] - marks[first]
+
+    def report(self):
+        for name, seconds in self.marks:
+            print(f"{name:<20} {seconds * 1000:8.1f} ms")
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""Measures headless game loop throughput across grid sizes, bot counts and difficulties.
+
+    $ python3 benchmark.py --save baseline.json
+    $ python3 benchmark.py --compare baseline.json
+
+Every configuration is stepped for a fixed number of ticks from a fixed seed, so runs
+on the same machine can be compared. Matches that end early are restarted.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import grid
+from engine import Engine
+from particle import ParticleSystem
+
+PHASES = [
+    "run_ai_logic",
+    "position_range_adder",
+    "analyze_positions",
+    "grid_reset",
+    "particle_move",
+]
+
+
+def create_engine(grid_size, bots, difficulty):
+    # Pad with humans that never steer so every match has at least two cycles
+    return Engine(
+        grid_size=grid_size, humans=max(0, 2 - bots), bots=bots, difficulty=difficulty
+    )
+
+
+def timed(func, name, totals):
+    """Wraps func so its calls and running time are added to totals[name]."""
+
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        totals[name][0] += 1
+        totals[name][1] += time.perf_counter() - start
+        return result
+
+    return wrapper
+
+
+def instrument(engine, totals):
+    engine.position_range_adder = timed(
+        engine.position_range_adder, "position_range_adder", totals
+    )
+    engine.analyze_positions = timed(
+        engine.analyze_positions, "analyze_positions", totals
+    )
+    engine.grid.reset = timed(engine.grid.reset, "grid_reset", totals)
+    for player in engine.players:
+        if player.is_ai:
+            player.run_ai_logic = timed(player.run_ai_logic, "run_ai_logic", totals)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run_ticks(config, ticks, seed, on_tick=None, on_engine=None):
+    """Steps engines for config until ticks have run. Returns per tick latencies."""
+    random.seed(seed)
+    latencies = []
+    engine = None
+    while len(latencies) < ticks:
+        if engine is None or not engine.game_on:
+            engine = create_engine(**config)
+            if on_engine:
+                on_engine(engine)
+        start = time.perf_counter()
+        crashed = engine.step()
+        if on_tick:
+            on_tick(crashed)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench(config, ticks, seed):
+    # Warm up, then a plain run for throughput and latency
+    run_ticks(config, min(ticks, 200), seed)
+    latencies = run_ticks(config, ticks, seed)
+
+    # Instrumented run for the phase breakdown and peak memory
+    totals = {name: [0, 0.0] for name in PHASES}
+    particles = ParticleSystem(20 * config["grid_size"], random.Random(seed))
+    particles.move = timed(particles.move, "particle_move", totals)
+
+    def move_particles(crashed):
+        if crashed:
+            particles.explode(*crashed.crash_pos, crashed.color)
+        particles.move()
+
+    tracemalloc.start()
+    run_ticks(
+        config,
+        ticks,
+        seed,
+        on_tick=move_particles,
+        on_engine=lambda engine: instrument(engine, totals),
+    )
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        **config,
+        "ticks": ticks,
+        "ticks_per_sec": round(len(latencies) / sum(latencies), 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 4),
+        "peak_kb": round(peak / 1024, 1),
+        "phases": {
+            name: {
+                "calls": calls,
+                "total_ms": round(total * 1000, 3),
+                "mean_us": round(total / calls * 1e6, 3) if calls else None,
+            }
+            for name, (calls, total) in totals.items()
+        },
+    }
+
+
+def config_key(result):
+    return (result["grid_size"], result["bots"], result["difficulty"])
+
+
+def print_result(result, baseline=None, threshold=10):
+    slowest = max(result["phases"].items(), key=lambda item: item[1]["total_ms"])
+    line = (
+        f"grid {result['grid_size']} bots {result['bots']} diff {result['difficulty']}: "
+        f"{result['ticks_per_sec']:>9.1f} ticks/s  p50 {result['p50_ms']:.3f} ms  "
+        f"p99 {result['p99_ms']:.3f} ms  peak {result['peak_kb']:.0f} KB  "
+        f"slowest {slowest[0]}"
+    )
+    if baseline:
+        change = 100 * (result["ticks_per_sec"] / baseline["ticks_per_sec"] - 1)
+        line += f"  {change:+.1f}%"
+        if change < -threshold:
+            line += " REGRESSION"
+    print(line)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--grid_size", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--bots", type=int, nargs="+", default=[0, 1, 2, 3, 4, 5])
+    parser.add_argument("--difficulty", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--ticks", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--compare", help="compare against a saved JSON baseline")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=10,
+        help="percent drop in ticks/s reported as a regression",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {config_key(result): result for result in json.load(f)["results"]}
+
+    results = []
+    for grid_size in args.grid_size:
+        for bots in args.bots:
+            for difficulty in args.difficulty:
+                config = {"grid_size": grid_size, "bots": bots, "difficulty": difficulty}
+                result = bench(config, args.ticks, args.seed)
+                results.append(result)
+                print_result(result, baseline.get(config_key(result)), args.threshold)
+
+    if args.save:
+        meta = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": grid.numpy is not None,
+            "ticks": args.ticks,
+            "seed": args.seed,
+        }
+        with open(args.save, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -12,6 +12,9 @@ KEY_BINDINGS = [
 
 OPPOSING_DIRS = {EAST: WEST, WEST: EAST, NORTH: SOUTH, SOUTH: NORTH}
 
+# Unit step for each heading, in screen coordinates
+DELTAS = {EAST: (1, 0), NORTH: (0, 1), WEST: (-1, 0), SOUTH: (0, -1)}
+
 SCREENS = {
     "main": {
         "path": "images/main_menu.gif",
@@ -40,4 +43,11 @@ SCREENS = {
     },
 }
 
+# Shows the performance HUD while a profiler is attached
+PROFILER_KEY = "F3"
+
+# Simulation ticks and drawn frames per second
+TICK_RATE = 120
+RENDER_RATE = 60
+
 DEBUG = {"testing": True, "difficulty": 3, "bots": 2, "humans": 0, "grid_size": 1}
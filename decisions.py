@@ -0,0 +1,152 @@
+"""Bot decisions in worker processes, against a copy of the grid in shared memory.
+
+    engine = Engine(grid_size=3, bots=4, difficulty=4)
+    engine.decisions = DecisionPool(engine, workers=4)
+    engine.run()
+    engine.decisions.close()
+
+Each tick the grid is copied into shared memory and every ready bot's decision is
+worked out in the pool, so all bots plan against the same snapshot of the start of the
+tick. Decisions are collected before anyone moves. A bot whose worker misses the
+deadline falls back on the reactive Ai policy for that tick, so heavy bot tiers can use
+several cores without holding up the frame.
+
+Workers are spawned rather than forked, so a script that creates a pool needs an
+`if __name__ == "__main__":` guard.
+"""
+import multiprocessing
+import struct
+import time
+from multiprocessing import shared_memory
+
+import constants
+
+from ai import Ai
+from grid import Grid
+from player import Player
+
+# Shared memory starts with the tick the snapshot was taken on, then the cells
+HEADER = struct.Struct("Q")
+
+# Set in each worker by attach
+shared = None
+grid = None
+
+
+def attach(name, width, height):
+    """Pool initializer: opens the shared snapshot as a read only Grid."""
+    global shared, grid
+    shared = shared_memory.SharedMemory(name)
+    cells = shared.buf[HEADER.size : HEADER.size + width * height]
+    grid = Grid(width, height, track_rays=False, cells=cells)
+
+
+def decide(tick, bot_class, difficulty, state, others, time_budget, node_limit):
+    """Runs one bot's logic on the snapshot of tick. state is the bot's (x, y, heading,
+    speed, frame), others holds (x, y, heading, status) for every other player.
+    node_limit is the bot's share of the search budget, if it searches. Returns
+    (direction or None, frame), or None if the snapshot has moved on to a later tick."""
+    if HEADER.unpack_from(shared.buf)[0] != tick:
+        return None
+    x, y, heading, speed, frame = state
+    bot = bot_class("", x, y, None, difficulty)
+    bot.setheading(heading)
+    bot.fwd_speed = speed
+    bot.frame = frame
+    # Workers cannot start pools of their own
+    bot.workers = 0
+    if hasattr(bot, "time_budget"):
+        bot.time_budget = min(bot.time_budget, time_budget)
+    if node_limit is not None:
+        bot.node_limit = node_limit
+    turns = []
+    bot.on_input = lambda player, dir: turns.append(dir)
+
+    players = [bot]
+    for x, y, heading, status in others:
+        other = Player("", x, y, None)
+        other.setheading(heading)
+        other.status = status
+        players.append(other)
+    bot.run_ai_logic(grid, players)
+    return (turns[-1] if turns else None, bot.frame)
+
+
+class DecisionPool:
+    """Works out the bots' decisions for an Engine in worker processes. deadline is how
+    long a tick waits for them, in seconds; MctsAi bots get at most half of it to
+    search. late counts the decisions that fell back on the reactive policy."""
+
+    def __init__(self, engine, workers=None, deadline=0.5 / constants.TICK_RATE):
+        self.engine = engine
+        self.deadline = deadline
+        self.late = 0
+        cells = getattr(engine.grid, "cells", None)
+        if cells is None:
+            raise ValueError("DecisionPool needs a cell Grid to snapshot")
+        self.shared = shared_memory.SharedMemory(
+            create=True, size=HEADER.size + len(cells)
+        )
+        # Spawned, not forked, so workers do not inherit the window's Tk state
+        self.pool = multiprocessing.get_context("spawn").Pool(
+            workers,
+            initializer=attach,
+            initargs=(self.shared.name, engine.grid.width, engine.grid.height),
+        )
+
+    def snapshot(self):
+        grid = self.engine.grid
+        self.shared.buf[HEADER.size : HEADER.size + len(grid.cells)] = grid.cells
+        HEADER.pack_into(self.shared.buf, 0, self.engine.tick)
+
+    def decide(self, players):
+        """Turns every ready bot in players as its logic decides on the current grid."""
+        bots = [
+            player for player in players if player.is_ai and player.status == player.READY
+        ]
+        if not bots:
+            return
+        self.snapshot()
+        tick = self.engine.tick
+        pending = []
+        for bot in bots:
+            state = (bot.xcor(), bot.ycor(), bot.heading(), bot.fwd_speed, bot.frame)
+            others = [
+                (other.xcor(), other.ycor(), other.heading(), other.status)
+                for other in players
+                if other is not bot
+            ]
+            args = (
+                tick,
+                type(bot),
+                bot.difficulty,
+                state,
+                others,
+                self.deadline / 2,
+                getattr(bot, "node_limit", None),
+            )
+            pending.append((bot, self.pool.apply_async(decide, args)))
+
+        deadline = time.perf_counter() + self.deadline
+        for bot, result in pending:
+            try:
+                decision = result.get(max(deadline - time.perf_counter(), 0))
+            except multiprocessing.TimeoutError:
+                decision = None
+            if decision is None:
+                self.late += 1
+                Ai.run_ai_logic(bot, self.engine.grid, players)
+                continue
+            dir, bot.frame = decision
+            if dir is not None:
+                bot.go_dir(dir)
+
+    def close(self):
+        """Stops the workers and frees the shared memory. Safe to call twice."""
+        if self.pool is None:
+            return
+        self.pool.terminate()
+        self.pool.join()
+        self.pool = None
+        self.shared.close()
+        self.shared.unlink()
@@ -0,0 +1,487 @@
+import colorsys
+import random
+import constants
+
+from ai import Ai, SpaceAi
+from grid import Grid, SegmentGrid
+from mcts import MctsAi
+from player import Player
+
+
+class Engine(object):
+    """Runs the light cycle rules without a display. Owns the players, the grid,
+    collision checks, lives and respawns. Call step to advance the match one tick."""
+
+    # Free cells a cycle respawned onto a partly filled grid needs ahead of it
+    respawn_clearance = 50
+
+    def __init__(
+        self,
+        grid_size=3,
+        humans=0,
+        bots=2,
+        difficulty=1,
+        vectorized=True,
+        seed=None,
+        derez=False,
+        segments=False,
+        simultaneous=False,
+    ):
+        # Every random draw that affects the match comes from this seed
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.rng = random.Random(self.seed)
+        self.grid_size = grid_size
+        # Store trails as segments instead of cells, see SegmentGrid
+        self.segments = segments
+        if segments and derez:
+            raise ValueError("derez mode needs a cell grid")
+        self.width = 800
+        self.height = 600
+        self.determine_grid_size(grid_size)
+        self.out_of_bounds_length = 50
+        self.x_boundary = (self.width // 2) - self.out_of_bounds_length
+        self.y_boundary = (self.height // 2) - self.out_of_bounds_length
+        self.grid = self.create_grid()
+        # Check whole runs at once when the grid can (Grid needs numpy for it)
+        self.vectorized = vectorized and self.grid.can_sweep
+        self.humans = humans
+        self.bots = bots
+        # In derez mode a crash only erases the crashed player's trail
+        self.derez = derez
+        # Derez mode only: (column, row) on a 64 cell lattice -> {id(rect): (player,
+        # rect)} for the trail rectangles touching that lattice cell
+        self.trail_buckets = {}
+        # Move everyone at once each tick and settle all crashes together, see
+        # resolve_moves
+        self.simultaneous = simultaneous
+        self.difficulty = difficulty
+        self.players = []
+        self.game_on = True
+        self.tick = 0
+        self.round = 0
+        # Every player that crashed in the last tick
+        self.crashed = []
+        # Set to a Recorder to capture inputs, or a Playback to feed them back in
+        self.recorder = None
+        self.playback = None
+        # Set to a DecisionPool to work out the bots' turns in worker processes
+        self.decisions = None
+        self.create_player()
+
+    def determine_grid_size(self, grid_size):
+        if grid_size == 2:
+            self.width, self.height = (1024, 768)
+        elif grid_size == 3:
+            self.width, self.height = (1280, 960)
+
+    def create_grid(self):
+        width = self.x_boundary * 2
+        height = self.y_boundary * 2
+        if self.segments:
+            return SegmentGrid(width, height)
+        return Grid(width, height)
+
+    def get_random_coord(self):
+        """Generates random coordinate within playable area with buffer from boundary"""
+        buffer = 100
+        x = self.rng.randint(-(self.x_boundary - buffer), (self.x_boundary - buffer))
+        y = self.rng.randint(-(self.y_boundary - buffer), (self.y_boundary - buffer))
+        return (x, y)
+
+    def position_range_adder(self, player):
+        """Calculates and collects all missing positions given prev and current position. Returns grid coordinates."""
+        positions = []
+
+        def get_missing_positions(prev, curr, step):
+            for pos in range(prev, curr, step):
+                positions.append(pos)
+            return positions
+
+        prev_xcor, prev_ycor = player.prev_pos
+        curr_xcor, curr_ycor = int(player.xcor()), int(player.ycor())
+        if prev_xcor == curr_xcor and prev_ycor == curr_ycor:
+            return positions
+
+        if player.heading() == constants.EAST:
+            positions = get_missing_positions(prev_xcor, curr_xcor, 1)
+        elif player.heading() == constants.NORTH:
+            positions = get_missing_positions(prev_ycor, curr_ycor, 1)
+        elif player.heading() == constants.WEST:
+            positions = get_missing_positions(prev_xcor, curr_xcor, -1)
+        elif player.heading() == constants.SOUTH:
+            positions = get_missing_positions(prev_ycor, curr_ycor, -1)
+        # Translate to grid coordinates
+        if player.heading() == constants.EAST or player.heading() == constants.WEST:
+            positions = [self.grid.get_grid_coord(x, prev_ycor) for x in positions]
+        elif player.heading() == constants.NORTH or player.heading() == constants.SOUTH:
+            positions = [self.grid.get_grid_coord(prev_xcor, y) for y in positions]
+        return positions
+
+    def create_player(self):
+        """P1 is blue, P2 is Yellow, P3 is Red, P4 is Green, P5 is Purple."""
+        for i in range(self.humans):
+            x, y = self.get_random_coord()
+            self.add_player(Player("P" + str(i + 1), x, y, self.next_color(), self.rng))
+
+        for i in range(self.bots):
+            self.add_ai("COM" + str(i + 1), self.difficulty)
+
+    def next_color(self):
+        """The first players get the fixed colors, the rest get generated ones."""
+        idx = len(self.players)
+        if idx < len(constants.COLORS):
+            return constants.COLORS[len(constants.COLORS) - 1 - idx]
+        # Golden ratio hue steps keep consecutive colors far apart
+        hue = (idx * 0.618033988749895) % 1
+        r, g, b = colorsys.hsv_to_rgb(hue, 0.75, 1.0)
+        return f"#{int(r * 255):02x}{int(g * 255):02x}{int(b * 255):02x}"
+
+    def add_ai(self, name, difficulty):
+        """Adds a bot at a random coordinate. Returns the new player."""
+        x, y = self.get_random_coord()
+        bot_class = {4: SpaceAi, 5: MctsAi}.get(difficulty, Ai)
+        player = bot_class(name, x, y, self.next_color(), difficulty, self.rng)
+        return self.add_player(player)
+
+    def add_player(self, player):
+        # Owner ids are one byte, players past the 255th share the last one
+        player.owner_id = min(len(self.players) + 1, 255)
+        self.players.append(player)
+        return player
+
+    def is_game_over(self):
+        """Checks to see if there's only one player left."""
+        return (
+            len(self.players)
+            - len([player for player in self.players if player.status == player.DEAD])
+            == 1
+        )
+
+    def get_winner(self):
+        """Returns the last player standing, or None while the match is running."""
+        alive = [player for player in self.players if player.status != player.DEAD]
+        if self.game_on or not alive:
+            return None
+        return alive[0]
+
+    def reset_players(self, players):
+        for player in players:
+            x, y = self.get_random_coord()
+            player.respawn(x, y)
+
+    def reset_grid(self):
+        alive_players = [
+            player for player in self.players if not player.status == player.DEAD
+        ]
+        self.reset_players(alive_players)
+
+        # Speed up game if no humans are alive
+        humans_alive = [player for player in alive_players if not player.is_ai]
+        if not humans_alive:
+            for player in alive_players:
+                player.set_speed(6)
+        self.grid.reset()
+        for player in self.players:
+            player.trail = []
+        self.trail_buckets.clear()
+        self.round += 1
+
+    def derez_player(self, player):
+        """Erases only player's trail from the grid and respawns it if it has lives
+        left. Costs time proportional to the trail, everyone else keeps riding."""
+        erased = player.trail
+        for rect in erased:
+            self.grid.erase_rect(*rect, player.owner_id)
+            for key in self.lattice_cells(*rect):
+                self.trail_buckets.get(key, {}).pop(id(rect), None)
+        player.trail = []
+        self.restore_overlaps(erased)
+        if player.status != player.DEAD:
+            self.respawn(player)
+
+    def lattice_cells(self, x0, y0, x1, y1):
+        """The cells of the 64 cell lattice that the inclusive rectangle touches."""
+        return [
+            (col, row)
+            for col in range(x0 // 64, x1 // 64 + 1)
+            for row in range(y0 // 64, y1 // 64 + 1)
+        ]
+
+    def restore_overlaps(self, erased):
+        """Cells keep the owner that marked them first, so erasing a trail also frees
+        the parts of other trails that ran across it. Marks those parts again. Only
+        the trail rectangles sharing a lattice cell with an erased one are compared."""
+        for x0, y0, x1, y1 in erased:
+            seen = set()
+            for key in self.lattice_cells(x0, y0, x1, y1):
+                for rect_id, (other, rect) in self.trail_buckets.get(key, {}).items():
+                    if rect_id in seen:
+                        continue
+                    seen.add(rect_id)
+                    ox0, oy0, ox1, oy1 = rect
+                    left, top = max(x0, ox0), max(y0, oy0)
+                    right, bottom = min(x1, ox1), min(y1, oy1)
+                    if left <= right and top <= bottom:
+                        self.grid.mark_rect(left, top, right, bottom, other.owner_id)
+
+    def respawn(self, player):
+        """Respawns player facing open space, trying a few spots before giving up."""
+        for _ in range(10):
+            x, y = self.get_random_coord()
+            player.respawn(x, y)
+            grid_x, grid_y = self.grid.get_grid_coord(x, y)
+            if (
+                self.grid.raycast(grid_x, grid_y, player.heading())
+                > self.respawn_clearance
+            ):
+                return
+
+    def crash(self, player, x, y):
+        """Marks player as crashed into grid coordinate x, y."""
+        player.status = player.CRASHED
+        player.crash_pos = player.position()
+        if 0 <= x < self.grid.width and 0 <= y < self.grid.height:
+            player.crash_cause = "trail"
+        else:
+            player.crash_cause = "wall"
+
+    def add_trail(self, player, first, last, amount):
+        """Records the band marked around the straight run first..last on player."""
+        (x0, y0), (x1, y1) = first, last
+        if player.heading() in (constants.EAST, constants.WEST):
+            left, right = min(x0, x1), max(x0, x1)
+            top, bottom = y0 - amount, y0 + amount
+        else:
+            left, right = x0 - amount, x0 + amount
+            top, bottom = min(y0, y1), max(y0, y1)
+        # Clipped to the grid like the marks themselves
+        left, top = max(left, 0), max(top, 0)
+        right = min(right, self.grid.width - 1)
+        bottom = min(bottom, self.grid.height - 1)
+        if left <= right and top <= bottom:
+            player.add_trail(left, top, right, bottom)
+            if self.derez:
+                # The rectangle this run was recorded in, new or extended
+                rect = player.trail[-1]
+                for key in self.lattice_cells(left, top, right, bottom):
+                    self.trail_buckets.setdefault(key, {})[id(rect)] = (player, rect)
+
+    def analyze_positions(self, player, positions):
+        """Check for collision. If no collision, set pos to visited."""
+        owner = player.owner_id
+        if self.vectorized:
+            if positions:
+                count = self.grid.sweep(positions, player.heading(), 5, owner)
+                if count:
+                    self.add_trail(player, positions[0], positions[count - 1], 5)
+                if count < len(positions):
+                    self.crash(player, *positions[count])
+            return
+
+        for x, y in positions:
+            if player.is_collision(self.grid, x, y):
+                self.crash(player, x, y)
+                return
+            else:
+                self.grid.set_pos_to_visited(x, y, owner)
+                self.grid.set_adjacent_coords_as_visited(player, x, y, 5, owner)
+                self.add_trail(player, (x, y), (x, y), 5)
+
+    def band(self, player, x, y, amount):
+        """Returns the cells set_adjacent_coords_as_visited marks for player at x, y."""
+        if player.heading() in (constants.EAST, constants.WEST):
+            if not 0 <= x < self.grid.width:
+                return []
+            low, high = max(y - amount, 0), min(y + amount, self.grid.height - 1)
+            return [(x, row) for row in range(low, high + 1)]
+        if not 0 <= y < self.grid.height:
+            return []
+        low, high = max(x - amount, 0), min(x + amount, self.grid.width - 1)
+        return [(col, y) for col in range(low, high + 1)]
+
+    def resolve_moves(self, players):
+        """Moves players at the same time. Their runs are walked in lockstep, one cell
+        per player per step, against the grid as it was at the start of the tick plus a
+        hash of the cells claimed so far this tick. A player crashes on a visited or
+        claimed cell, or on a cell another player claims in the same step, so head-on
+        and same cell arrivals crash both. Then every run is marked in one pass. Runs
+        too far from the others to meet them are checked and marked straight away."""
+        runs = {}
+        boxes = {}
+        for player in players:
+            player.set_prev_coord()
+            player.forward(player.fwd_speed)
+            run = runs[player] = self.position_range_adder(player)
+            if run:
+                # Every cell the run could read or mark
+                (x0, y0), (x1, y1) = run[0], run[-1]
+                x0, x1 = min(x0, x1) - 5, max(x0, x1) + 5
+                y0, y1 = min(y0, y1) - 5, max(y0, y1) + 5
+                boxes[player] = (x0, y0, x1, y1)
+
+        # Runs that cannot touch another run this tick are settled on their own. Boxes
+        # are bucketed on a coarse lattice, so only runs close together are compared.
+        buckets = {}
+        for player, (x0, y0, x1, y1) in boxes.items():
+            for col in range(x0 // 64, x1 // 64 + 1):
+                for row in range(y0 // 64, y1 // 64 + 1):
+                    buckets.setdefault((col, row), []).append(player)
+        near = set()
+        for bucket in buckets.values():
+            for i, player in enumerate(bucket):
+                x0, y0, x1, y1 = boxes[player]
+                for other in bucket[i + 1 :]:
+                    ox0, oy0, ox1, oy1 = boxes[other]
+                    if x0 <= ox1 and ox0 <= x1 and y0 <= oy1 and oy0 <= y1:
+                        near.update((player, other))
+        for player in players:
+            if player not in near:
+                self.analyze_positions(player, runs[player])
+        players = [player for player in players if player in near]
+
+        # Cells marked so far this tick, written to the grid at the end
+        claimed = set()
+        cleared = dict.fromkeys(players, 0)
+        step = 0
+        active = list(players)
+        while active:
+            arrivals = {}
+            for player in active:
+                x, y = runs[player][step]
+                if self.grid.is_visited(x, y) or (x, y) in claimed:
+                    self.crash(player, x, y)
+                else:
+                    arrivals[player] = (x, y)
+            # Cells claimed in this step, by path or band, and who claims them
+            bands = {}
+            claims = {}
+            for player, (x, y) in arrivals.items():
+                bands[player] = self.band(player, x, y, 5)
+                for cell in bands[player]:
+                    claims.setdefault(cell, []).append(player)
+            for player, cell in arrivals.items():
+                if len(claims[cell]) > 1:
+                    self.crash(player, *cell)
+                    continue
+                cleared[player] += 1
+                claimed.update(bands[player])
+            step += 1
+            active = [
+                player
+                for player in active
+                if player.status == player.READY and step < len(runs[player])
+            ]
+
+        for player in players:
+            run = runs[player][: cleared[player]]
+            if not run:
+                continue
+            owner = player.owner_id
+            count = 0
+            if self.vectorized:
+                count = self.grid.sweep(run, player.heading(), 5, owner)
+            # The sweep stops where a band marked later in the tick crosses the run
+            for x, y in run[count:]:
+                self.grid.set_pos_to_visited(x, y, owner)
+                self.grid.set_adjacent_coords_as_visited(player, x, y, 5, owner)
+            self.add_trail(player, run[0], run[-1], 5)
+
+    def resolve_crashes(self):
+        """Every player that crashed this tick loses a life. Ends the match if at most
+        one player is left, a draw if none are. Otherwise resets the round, or in derez
+        mode erases each crashed player's trail."""
+        self.crashed = [
+            player for player in self.players if player.status == player.CRASHED
+        ]
+        if not self.crashed:
+            return
+        for player in self.crashed:
+            player.lose_life()
+        alive = [player for player in self.players if player.status != player.DEAD]
+        if len(alive) <= 1:
+            self.game_on = False
+        elif self.derez:
+            for player in self.crashed:
+                self.derez_player(player)
+        else:
+            self.reset_grid()
+
+    def move_player(self, player):
+        """Moves a player forward one tick and checks the cells it passed through."""
+        player.set_prev_coord()
+        player.forward(player.fwd_speed)
+        positions = self.position_range_adder(player)
+        self.analyze_positions(player, positions)
+
+    def share_search_budget(self):
+        """Splits one tick's search between the Expert bots still riding. MctsAi plans
+        within its own deadline instead."""
+        experts = [
+            player
+            for player in self.players
+            if isinstance(player, SpaceAi)
+            and not isinstance(player, MctsAi)
+            and player.status == player.READY
+        ]
+        for player in experts:
+            player.share_search_budget(len(experts))
+
+    def step(self):
+        """Advances the match one tick. Returns the player that crashed, if any. A crash
+        costs a life and resets the round, or ends the match if one player is left.
+        Only the first crash in player order counts unless the engine is simultaneous;
+        self.crashed lists the crashes that counted."""
+        if not self.game_on:
+            return None
+        if self.playback:
+            self.playback.apply_inputs(self)
+        for player in self.players:
+            # At most one queued keypress per player per tick
+            dir = player.inputs.pop()
+            if dir is not None and player.status == player.READY:
+                player.go_dir(dir)
+        self.share_search_budget()
+        if self.decisions and not self.playback:
+            # Every bot decides on the grid as it was at the start of the tick
+            self.decisions.decide(self.players)
+        if self.simultaneous:
+            ready = [player for player in self.players if player.status == player.READY]
+            for player in ready:
+                if player.is_ai and not self.playback and not self.decisions:
+                    player.run_ai_logic(self.grid, self.players)
+            self.resolve_moves(ready)
+        else:
+            for player in self.players:
+                if player.status == player.READY:
+                    if player.is_ai and not self.playback and not self.decisions:
+                        player.run_ai_logic(self.grid, self.players)
+                    self.move_player(player)
+
+        self.handle_crashes()
+        self.tick += 1
+        return self.crashed[0] if self.crashed else None
+
+    def handle_crashes(self):
+        """Applies this tick's crashes and lists the ones that counted in self.crashed.
+        Subclasses override this to change what a crash does."""
+        if self.simultaneous:
+            self.resolve_crashes()
+            return
+        self.crashed = []
+        for player in self.players:
+            if player.status == player.CRASHED:
+                player.lose_life()
+                if self.is_game_over():
+                    self.game_on = False
+                elif self.derez:
+                    self.derez_player(player)
+                else:
+                    self.reset_grid()
+                self.crashed = [player]
+                break
+
+    def run(self, max_ticks=None):
+        """Steps the match until it ends or max_ticks is reached. Returns the winner."""
+        while self.game_on and (max_ticks is None or self.tick < max_ticks):
+            self.step()
+        return self.get_winner()
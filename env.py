@@ -0,0 +1,201 @@
+"""Reinforcement learning environment around the game rules. Requires numpy.
+
+    env = TronEnv(grid_size=1, agents=1, bots=1)
+    observations, info = env.reset(seed=0)
+    while True:
+        actions = [policy(observations, i) for i in range(env.agents)]
+        observations, rewards, terminated, truncated, info = env.step(actions)
+        if terminated.all() or truncated:
+            break
+
+Follows the Gymnasium reset/step conventions without depending on it. Agents are the
+engine's human players, driven by actions instead of keys. The remaining players
+are bots.
+"""
+import numpy
+
+import constants
+
+from engine import Engine
+
+# Action i steers towards ACTIONS[i], NOOP keeps the current heading and speed
+ACTIONS = [constants.EAST, constants.NORTH, constants.WEST, constants.SOUTH]
+NOOP = len(ACTIONS)
+# Per agent state: heading one-hot (4), speed, lives
+STATE_SIZE = len(ACTIONS) + 2
+
+
+class Pyramid:
+    """Downsampled copies of a grid. Level k holds one cell per 2**k by 2**k block of
+    the grid, set if any cell in the block is marked. Levels are padded with marked
+    cells on every side, so a crop that reaches past the walls is still a plain slice.
+    Marks are pushed up level by level for just the rectangle that changed."""
+
+    def __init__(self, array, levels, pad):
+        self.array = array
+        self.pad = pad
+        self.padded = []
+        self.levels = [array]
+        height, width = array.shape
+        for _ in range(levels):
+            height, width = (height + 1) // 2, (width + 1) // 2
+            padded = numpy.ones((height + 2 * pad, width + 2 * pad), dtype=numpy.uint8)
+            self.padded.append(padded)
+            self.levels.append(padded[pad : pad + height, pad : pad + width])
+        self.rebuild()
+
+    def rebuild(self):
+        height, width = self.array.shape
+        self.update(0, 0, width - 1, height - 1)
+
+    def update(self, x0, y0, x1, y1):
+        """Recomputes every level over the inclusive grid rectangle."""
+        for src, dst in zip(self.levels, self.levels[1:]):
+            x0, y0, x1, y1 = x0 // 2, y0 // 2, x1 // 2, y1 // 2
+            block = src[2 * y0 : 2 * y1 + 2, 2 * x0 : 2 * x1 + 2]
+            out = dst[y0 : y1 + 1, x0 : x1 + 1]
+            out[...] = 0
+            for dy in (0, 1):
+                for dx in (0, 1):
+                    part = block[dy::2, dx::2]
+                    out[: part.shape[0], : part.shape[1]] |= part != 0
+
+    def crop(self, level, x, y, size, heading):
+        """Returns a size by size view of level centered on grid cell x, y, turned so
+        that row 0 lies furthest ahead in heading and column 0 on the left."""
+        scale = 2**level
+        half = size // 2
+        cx = x // scale + self.pad
+        cy = y // scale + self.pad
+        padded = self.padded[level - 1]
+        view = padded[cy - half : cy - half + size, cx - half : cx - half + size]
+        if heading == constants.NORTH:
+            return view[::-1, :]
+        elif heading == constants.SOUTH:
+            return view[:, ::-1]
+        elif heading == constants.EAST:
+            return view.T[::-1, ::-1]
+        return view.T
+
+
+class TronEnv:
+    """Light cycle matches as an environment. Observations are a dict with "grid", an
+    (agents, crop, crop) uint8 array of egocentric crops of the downsampled grid, and
+    "state", an (agents, STATE_SIZE) float32 array of heading, speed and lives.
+    Rewards are survival_reward for every tick an agent rides and crash_penalty for
+    every life it loses. The observation arrays are reused by every step, copy them to
+    keep them."""
+
+    def __init__(
+        self,
+        grid_size=1,
+        agents=1,
+        bots=1,
+        difficulty=2,
+        crop=32,
+        scale=8,
+        max_ticks=5000,
+        survival_reward=0.01,
+        crash_penalty=-1.0,
+        derez=False,
+    ):
+        if scale < 2 or scale & (scale - 1):
+            raise ValueError("scale must be a power of two, at least 2")
+        self.grid_size = grid_size
+        self.agents = agents
+        self.bots = bots
+        self.difficulty = difficulty
+        self.crop = crop
+        self.level = scale.bit_length() - 1
+        self.max_ticks = max_ticks
+        self.survival_reward = survival_reward
+        self.crash_penalty = crash_penalty
+        self.derez = derez
+        self.engine = None
+        self.pyramid = None
+        self.observations = {
+            "grid": numpy.zeros((agents, crop, crop), dtype=numpy.uint8),
+            "state": numpy.zeros((agents, STATE_SIZE), dtype=numpy.float32),
+        }
+
+    def reset(self, seed=None):
+        """Starts a new match. Returns (observations, info)."""
+        self.engine = Engine(
+            grid_size=self.grid_size,
+            humans=self.agents,
+            bots=self.bots,
+            difficulty=self.difficulty,
+            seed=seed,
+            derez=self.derez,
+        )
+        if not self.engine.vectorized:
+            raise RuntimeError("TronEnv needs a numpy backed Grid")
+        self.pyramid = Pyramid(self.engine.grid.array, self.level, self.crop)
+        return self.observe(), self.info()
+
+    def step(self, actions):
+        """Applies one action per agent and advances one tick. Returns (observations,
+        rewards, terminated, truncated, info); terminated is per agent."""
+        engine = self.engine
+        agents = engine.players[: self.agents]
+        for player, action in zip(agents, actions):
+            if action != NOOP and player.status == player.READY:
+                player.inputs.push(ACTIONS[action], 0)
+        lives = [player.lives for player in agents]
+        round_before = engine.round
+
+        crashed = engine.step()
+        for player in agents:
+            player.inputs.drain_applied()
+
+        if crashed or engine.round != round_before:
+            # Resets and erased trails touch the whole grid
+            self.pyramid.rebuild()
+        else:
+            self.update_pyramid()
+
+        rewards = numpy.zeros(self.agents, dtype=numpy.float32)
+        terminated = numpy.zeros(self.agents, dtype=bool)
+        for i, player in enumerate(agents):
+            if player.lives < lives[i]:
+                rewards[i] = self.crash_penalty
+            elif player.status == player.READY:
+                rewards[i] = self.survival_reward
+            terminated[i] = player.status == player.DEAD or not engine.game_on
+        truncated = engine.game_on and engine.tick >= self.max_ticks
+        return self.observe(), rewards, terminated, truncated, self.info()
+
+    def update_pyramid(self):
+        """Pushes this tick's marks up the pyramid: the run each cycle swept, with the
+        band around it."""
+        grid = self.engine.grid
+        amount = 5
+        for player in self.engine.players:
+            if player.status != player.READY:
+                continue
+            x0, y0 = grid.get_grid_coord(*player.prev_pos)
+            x1, y1 = grid.get_grid_coord(player.xcor(), player.ycor())
+            left = max(min(x0, x1) - amount, 0)
+            right = min(max(x0, x1) + amount, grid.width - 1)
+            bottom = max(min(y0, y1) - amount, 0)
+            top = min(max(y0, y1) + amount, grid.height - 1)
+            if left <= right and bottom <= top:
+                self.pyramid.update(left, bottom, right, top)
+
+    def observe(self):
+        grid = self.engine.grid
+        crops = self.observations["grid"]
+        state = self.observations["state"]
+        state[...] = 0
+        for i, player in enumerate(self.engine.players[: self.agents]):
+            x, y = grid.get_grid_coord(player.xcor(), player.ycor())
+            x = min(max(x, 0), grid.width - 1)
+            y = min(max(y, 0), grid.height - 1)
+            crops[i] = self.pyramid.crop(self.level, x, y, self.crop, player.heading())
+            state[i, ACTIONS.index(player.heading())] = 1
+            state[i, 4] = player.fwd_speed
+            state[i, 5] = player.lives
+        return self.observations
+
+    def info(self):
+        return {"tick": self.engine.tick, "round": self.engine.round}
@@ -1,26 +1,27 @@
 #!/usr/bin/env python3
 
 import turtle
-import os
 import random
 import constants
 import functools
 
 # Dev assets
-from ai import Ai
-from grid import Grid
-from particle import Particle
+from decisions import DecisionPool
+from engine import Engine
+from inputs import LatencyHistogram
+from lightcycle import Lightcycle
+from mcts import MctsAi, close_pool
+from particle import ParticleSystem
 from pen import Pen
-from player import Player
+from profiler import TickProfiler
+from replay import Recorder
+from scheduler import Scheduler
 from sound import Sound
 
-# For windows audio
-if os.name == "nt":
-    import winsound
-
 
 class Game(object):
-    """Creates screen, draws border, creates all sprites, maps keys, draws score, and runs game loop."""
+    """Creates screen, draws border, creates all sprites, maps keys, draws score, and runs game loop.
+    The rules run in a headless Engine; this class only renders it."""
 
     def __init__(
         self,
@@ -29,35 +30,62 @@ class Game(object):
         bots=2,
         testing=False,
         difficulty=1,
+        tick_rate=constants.TICK_RATE,
+        render_rate=constants.RENDER_RATE,
+        seed=None,
+        replay_path=None,
+        engine=None,
+        profile=False,
+        trace_path=None,
+        derez=False,
+        decision_workers=0,
+        simultaneous=False,
+        mcts_workers=0,
     ):
-        self.width = 800
-        self.height = 600
-        self.determine_grid_size(grid_size)
+        # An engine can be passed in to watch a replay
+        self.engine = engine or Engine(
+            grid_size=grid_size,
+            humans=humans,
+            bots=bots,
+            difficulty=difficulty,
+            seed=seed,
+            derez=derez,
+            simultaneous=simultaneous,
+        )
+        self.recorder = None
+        if replay_path and not self.engine.playback:
+            self.recorder = Recorder(self.engine)
+        self.replay_path = replay_path
+        # Bots decide in that many worker processes, see DecisionPool
+        if decision_workers:
+            self.engine.decisions = DecisionPool(self.engine, decision_workers)
+        # MctsAi bots also search in that many worker processes
+        for player in self.engine.players:
+            if isinstance(player, MctsAi):
+                player.workers = mcts_workers
+        self.width = self.engine.width
+        self.height = self.engine.height
         self.create_screen()
         self.audio = Sound()
-        self.out_of_bounds_length = 50
-        self.x_boundary = (self.width // 2) - self.out_of_bounds_length
-        self.y_boundary = (self.height // 2) - self.out_of_bounds_length
-        self.grid = self.create_grid()
+        self.x_boundary = self.engine.x_boundary
+        self.y_boundary = self.engine.y_boundary
         self.humans = humans
         self.bots = bots
         self.difficulty = difficulty
-        self.players = []
-        self.particles = []
+        self.players = self.engine.players
+        self.lightcycles = []
         self.game_on = True
+        self.on_end = None
         self.testing = testing
+        self.scheduler = Scheduler(tick_rate, render_rate)
+        # Time from keypress to the first frame drawn after it was applied
+        self.input_latency = LatencyHistogram()
         self.create_assets()
-
-    def determine_grid_size(self, grid_size):
-        if grid_size == 2:
-            self.width, self.height = (1024, 768)
-        elif grid_size == 3:
-            self.width, self.height = (1280, 960)
-
-    def create_grid(self):
-        width = self.x_boundary * 2
-        height = self.y_boundary * 2
-        return Grid(width, height)
+        # Per phase timings, shown with PROFILER_KEY and saved to trace_path
+        self.profiler = None
+        self.trace_path = trace_path
+        if profile or trace_path:
+            self.attach_profiler()
 
     def create_screen(self):
         """Maximizes screen based on monitor size."""
@@ -86,102 +114,88 @@ class Game(object):
                 self.border_pen.left(90)
         self.border_pen.penup()
 
-    def get_random_coord(self):
-        """Generates random coordinate within playable area with buffer from boundary"""
-        buffer = 100
-        x = random.randint(-(self.x_boundary - buffer), (self.x_boundary - buffer))
-        y = random.randint(-(self.y_boundary - buffer), (self.y_boundary - buffer))
-        return (x, y)
-
-    def position_range_adder(self, player):
-        """Calculates and collects all missing positions given prev and current position. Returns grid coordinates."""
-        positions = []
-
-        def get_missing_positions(prev, curr, step):
-            for pos in range(prev, curr, step):
-                positions.append(pos)
-            return positions
-
-        prev_xcor, prev_ycor = player.prev_pos
-        curr_xcor, curr_ycor = int(player.xcor()), int(player.ycor())
-        if prev_xcor == curr_xcor and prev_ycor == curr_ycor:
-            return positions
-
-        if player.heading() == constants.EAST:
-            positions = get_missing_positions(prev_xcor, curr_xcor, 1)
-        elif player.heading() == constants.NORTH:
-            positions = get_missing_positions(prev_ycor, curr_ycor, 1)
-        elif player.heading() == constants.WEST:
-            positions = get_missing_positions(prev_xcor, curr_xcor, -1)
-        elif player.heading() == constants.SOUTH:
-            positions = get_missing_positions(prev_ycor, curr_ycor, -1)
-        # Translate to grid coordinates
-        if player.heading() == constants.EAST or player.heading() == constants.WEST:
-            positions = [self.grid.get_grid_coord(x, prev_ycor) for x in positions]
-        elif player.heading() == constants.NORTH or player.heading() == constants.SOUTH:
-            positions = [self.grid.get_grid_coord(prev_xcor, y) for y in positions]
-        return positions
-
-    def create_player(self):
-        """P1 is blue, P2 is Yellow, P3 is Red, P4 is Green, P5 is Purple."""
-        color_idx = len(constants.COLORS) - 1
-        for i in range(self.humans):
-            x, y = self.get_random_coord()
-            self.players.append(
-                Player("P" + str(i + 1), x, y, constants.COLORS[color_idx])
-            )
-            color_idx -= 1
-
-        for i in range(self.bots):
-            x, y = self.get_random_coord()
-            self.players.append(
-                Ai(
-                    "COM" + str(i + 1),
-                    x,
-                    y,
-                    constants.COLORS[color_idx],
-                    self.difficulty,
-                )
-            )
-            color_idx -= 1
+    def create_lightcycles(self):
+        """Creates one sprite per player in the engine."""
+        for player in self.players:
+            self.lightcycles.append(Lightcycle(player))
 
     def create_particles(self):
-        """Populates particles list. All particles act in same manner."""
-        for _ in range(20):
-            self.particles.append(Particle())
+        """One particle system shared by every crash. Bigger grids get more particles."""
+        rng = random.Random(self.engine.seed)
+        count = 20 * self.engine.grid_size
+        self.particles = ParticleSystem(count, rng, self.screen)
+
+    def attach_profiler(self):
+        self.profiler = TickProfiler()
+        self.profiler.instrument_engine(self.engine)
+        self.particles.move = self.profiler.timed(self.particles.move, "particles")
+        self.draw_score = self.profiler.timed(self.draw_score, "score")
+        self.render_frame = self.profiler.timed(self.render_frame, "render")
+        self.hud_pen = Pen("#40BBE3")
+        self.hud_pen.setposition(self.width / 2 - 20, self.height / 2 - 40)
+        self.hud_visible = False
+        self.hud_drawn_at = 0
+
+    def toggle_hud(self):
+        self.hud_visible = not self.hud_visible
+        if not self.hud_visible:
+            self.hud_pen.clear()
+
+    def draw_hud(self):
+        """Redraws the profiler summary, at most 4 times a second."""
+        now = self.scheduler.clock()
+        if now - self.hud_drawn_at < 0.25:
+            return
+        self.hud_drawn_at = now
+        self.hud_pen.clear()
+        self.hud_pen.write(
+            self.profiler.summary(), align="right", font=("Verdana", 14, "normal")
+        )
 
     def particles_explode(self, player):
         """Makes all particles explode at player crash position"""
-        for particle in self.particles:
-            particle.change_color(player)
-            particle.explode(player.xcor(), player.ycor())
+        x, y = player.crash_pos
+        self.particles.explode(x, y, player.color)
 
     def set_keyboard_bindings(self):
         """Maps absolute controls to player movement."""
         player_bindings = constants.KEY_BINDINGS
         for i in range(self.humans):
             self.key_mapper(self.players[i], **player_bindings[i])
+        if self.profiler:
+            turtle.onkeypress(self.toggle_hud, constants.PROFILER_KEY)
 
     def key_mapper(self, player, EAST, NORTH, WEST, SOUTH):
-        """Maps args to player controls"""
+        """Maps args to player controls. Keypresses are queued and applied by the
+        engine at the start of the next tick."""
 
         turtle.onkeypress(
-            functools.partial(player.go_dir, dir=constants.EAST),
+            functools.partial(self.queue_input, player, constants.EAST),
             EAST,
         )
         turtle.onkeypress(
-            functools.partial(player.go_dir, dir=constants.NORTH),
+            functools.partial(self.queue_input, player, constants.NORTH),
             NORTH,
         )
         turtle.onkeypress(
-            functools.partial(player.go_dir, dir=constants.WEST),
+            functools.partial(self.queue_input, player, constants.WEST),
             WEST,
         )
         turtle.onkeypress(
-            functools.partial(player.go_dir, dir=constants.SOUTH),
+            functools.partial(self.queue_input, player, constants.SOUTH),
             SOUTH,
         )
 
+    def queue_input(self, player, dir):
+        player.inputs.push(dir, self.scheduler.clock())
+
+    def record_input_latency(self):
+        """Called after a frame is drawn, for every input applied since the last one."""
+        now = self.scheduler.clock()
+        for player in self.players:
+            for timestamp in player.inputs.drain_applied():
+                self.input_latency.add(now - timestamp)
+
     def draw_score(self):
         """This draws the score on the screen once, then clears once the score changes. Start position is upper left corner.
         A dedicated score pen is needed because the clear function is called every time the score is updated."""
@@ -193,54 +207,41 @@ class Game(object):
             )
             self.score_pen.pendown()
             lives = f"{player.name}: {player.lives * '*'}"
-            color = player.color()[0]
-            self.score_pen.color(color)
+            self.score_pen.color(player.color)
             self.score_pen.write(lives, font=("Verdana", 18, "bold"))
             self.score_pen.penup()
             x_offset += 125
 
-    def is_game_over(self):
-        """Checks to see if there's only one player left."""
-        return (
-            len(self.players)
-            - len([player for player in self.players if player.status == player.DEAD])
-            == 1
-        )
-
     def display_winner(self):
         """Once game loop finishes, this runs to display the winner."""
         self.game_text_pen.pendown()
-        winner = [
-            player.name for player in self.players if player.status == player.READY
-        ][0]
-        self.game_text_pen.write(
-            f"{winner} wins!", align="center", font=self.game_text_pen.font
-        )
+        winner = self.engine.get_winner()
+        text = f"{winner.name} wins!" if winner else "Draw!"
+        self.game_text_pen.write(text, align="center", font=self.game_text_pen.font)
+
+    def derez_lightcycles(self, players):
+        """Clears only the crashed players' trails and moves them to their respawn
+        positions."""
+        for lightcycle in self.lightcycles:
+            player = lightcycle.player
+            if player in players:
+                lightcycle.clear_lightcycle()
+                if player.status != player.DEAD:
+                    lightcycle.respawn()
+            else:
+                lightcycle.sync()
 
-    def reset_players(self, players):
-        for player in players:
-            player.clear_lightcycle()
-            x, y = self.get_random_coord()
-            player.respawn(x, y)
-
-    def reset_grid(self):
-        alive_players = [
-            player for player in self.players if not player.status == player.DEAD
-        ]
-        self.reset_players(alive_players)
-
-        # Speed up game if no humans are alive
-        humans_alive = [player for player in alive_players if not player.is_ai]
-        if not humans_alive:
-            for player in alive_players:
-                player.set_speed(6)
-        self.grid = self.create_grid()
+    def reset_lightcycles(self):
+        """Clears every trail and moves the light cycles to their respawn positions."""
+        for lightcycle in self.lightcycles:
+            lightcycle.clear_lightcycle()
+            if lightcycle.player.status != lightcycle.player.DEAD:
+                lightcycle.respawn()
 
     def countdown(self, num):
         self.game_text_pen.pendown()
         self.game_text_pen.write(str(num), align="center", font=self.game_text_pen.font)
-        if os.name == "posix":
-            os.system(f"say {num}&")
+        self.audio.speak(str(num))
         self.game_text_pen.clear()
 
     def create_pens(self):
@@ -252,7 +253,7 @@ class Game(object):
     def create_assets(self):
         self.create_pens()
         self.create_border()
-        self.create_player()
+        self.create_lightcycles()
         self.create_particles()
         self.draw_score()
         for num in range(3, 0, -1):
@@ -261,65 +262,151 @@ class Game(object):
             t.setundobuffer(None)
 
     def end_game(self):
-        """Game over cleanup."""
+        """Game over cleanup. The winner stays on screen for 3 seconds, then the screen
+        is cleared and on_end is called."""
         self.game_on = False
-        turtle.ontimer(self.display_winner(), 3000)
-        self.screen.clear()
+        if self.recorder:
+            self.recorder.finish().save(self.replay_path)
+        self.display_winner()
         self.audio.stop_music()
+        self.screen.ontimer(self.finish_game, 3000)
+
+    def finish_game(self):
+        if self.profiler and self.trace_path:
+            self.profiler.save(self.trace_path)
+        self.close_workers()
+        self.screen.clear()
+        if self.on_end:
+            self.on_end()
+
+    def close_workers(self):
+        """Stops the bots' worker processes and frees the grid snapshot."""
+        if self.engine.decisions:
+            self.engine.decisions.close()
+        # Planning workers of any MctsAi
+        close_pool()
 
     def set_crash_sequence(self, player):
-        player.lose_life()
         self.particles_explode(player)
         self.audio.play_sfx("explosion")
         self.draw_score()
 
-    def analyze_positions(self, player, positions):
-        """Check for collision. If no collision, set pos to visited."""
-        for x, y in positions:
-            if player.is_collision(self.grid, x, y):
-                player.status = player.CRASHED
-                return
-            else:
-                self.grid.set_pos_to_visited(x, y)
-                self.grid.set_adjacent_coords_as_visited(player, x, y, 5)
-
-    def start_game(self):
+    def tick(self):
+        """Advances the engine one tick and moves the sprites to match."""
+        # Set players into motion, check collisions and handle crashes
+        crashed = self.engine.step()
+        playback = self.engine.playback
+        if playback and playback.is_finished(self.engine) and self.engine.game_on:
+            self.engine.game_on = False
+
+        self.particles.move()
+
+        # If a player crashes, particles explode and reset lightcycles
+        if crashed:
+            for player in self.engine.crashed:
+                self.set_crash_sequence(player)
+            if self.engine.game_on and self.engine.derez:
+                self.derez_lightcycles(self.engine.crashed)
+            elif self.engine.game_on:
+                self.reset_lightcycles()
+        else:
+            for lightcycle in self.lightcycles:
+                lightcycle.sync()
+
+        if not self.engine.game_on:
+            self.end_game()
+
+    def start_game(self, on_end=None):
         """All players are set into motion, boundary checks, and collision checks
-        run continuously until a player runs out of lives."""
+        run at a fixed tick rate until a player runs out of lives. Frames are driven by
+        Tk timers, so this returns straight away and the Tk main loop must be running.
+        on_end is called once the match is over and the screen has been cleared."""
         if not self.testing:
             self.audio.start_music("gameplay", True)
 
         # Set controls based on menu setting
         self.set_keyboard_bindings()
-        while self.game_on:
-            # Activate key mappings
-            self.screen.listen()
-            # Set players into motion and add converted coords to positions
-            for player in self.players:
-                if player.status == player.READY:
-                    if player.is_ai:
-                        player.run_ai_logic(self.grid)
-                    player.set_prev_coord()
-                    player.forward(player.fwd_speed)
-                    positions = self.position_range_adder(player)
-                    self.analyze_positions(player, positions)
-
-            for particle in self.particles:
-                particle.move()
-
-            # If a player crashes, particles explode and reset lightcycles
-            for player in self.players:
-                if player.status == player.CRASHED:
-                    self.set_crash_sequence(player)
-                    if self.is_game_over():
-                        self.end_game()
-                    else:
-                        self.reset_grid()
-                    break
-            # Updates screen only when loop is complete
-            self.screen.update()
+        self.on_end = on_end
+        self.scheduler.start()
+        self.run_frame()
+
+    def run_frame(self):
+        """Runs the ticks that are due, redraws if a frame is due and schedules the
+        next call for when the next tick or frame is due."""
+        now = self.scheduler.clock()
+        for _ in range(self.scheduler.ticks_due(now)):
+            if self.profiler:
+                self.profiler.begin_tick(self.engine.tick)
+            self.tick()
+            if self.profiler:
+                self.profiler.end_tick()
+            if not self.game_on:
+                return
+        if self.scheduler.render_due(now):
+            self.render_frame()
+        delay_ms = max(int(self.scheduler.delay() * 1000), 1)
+        self.screen.ontimer(self.run_frame, delay_ms)
+
+    def render_frame(self):
+        # Activate key mappings
+        self.screen.listen()
+        if self.profiler:
+            self.profiler.end_frame()
+            if self.hud_visible:
+                self.draw_hud()
+        self.screen.update()
+        self.record_input_latency()
 
 
 if __name__ == "__main__":
-    gameObj = Game(**constants.DEBUG)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Runs a debug match")
+    parser.add_argument(
+        "--trace", help="profile the match and write a CSV or JSON trace here"
+    )
+    parser.add_argument(
+        "--derez", action="store_true", help="a crash only erases that player's trail"
+    )
+    parser.add_argument(
+        "--simultaneous",
+        action="store_true",
+        help="move everyone at once, so head-on crashes are draws",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="work out the bots' decisions in this many processes",
+    )
+    parser.add_argument(
+        "--difficulty",
+        type=int,
+        default=constants.DEBUG["difficulty"],
+        help="bot difficulty, 1-5",
+    )
+    parser.add_argument(
+        "--mcts_workers",
+        type=int,
+        default=0,
+        help="Master bots (difficulty 5) also search in this many processes",
+    )
+    args = parser.parse_args()
+    gameObj = Game(
+        **dict(constants.DEBUG, difficulty=args.difficulty),
+        profile=True,
+        trace_path=args.trace,
+        derez=args.derez,
+        decision_workers=args.workers,
+        simultaneous=args.simultaneous,
+        mcts_workers=args.mcts_workers,
+    )
     gameObj.start_game()
+    try:
+        turtle.mainloop()
+    finally:
+        # The window can be closed mid-match, before finish_game runs
+        gameObj.close_workers()
+    print("\n".join(gameObj.input_latency.report()))
+    dropped = sum(player.inputs.dropped for player in gameObj.players)
+    print(f"{dropped} keypresses dropped on a full input queue")
@@ -1,39 +1,470 @@
+import ctypes
+import re
+from bisect import bisect_left, bisect_right, insort
+
 import constants
 
+from raycast import IntervalSet, RayIndex
+
+try:
+    import numpy
+except ImportError:
+    # Optional, enables Grid.sweep
+    numpy = None
+
+# Byte translation tables. FILL[owner] claims free cells for owner and leaves cells
+# other cycles own alone, ERASE[owner] frees the cells owner owns.
+FILL = [bytes([owner]) + bytes(range(1, 256)) for owner in range(256)]
+ERASE = [
+    bytes(0 if value == owner else value for value in range(256)) for owner in range(256)
+]
+OCCUPIED = re.compile(rb"[^\x00]+")
+
 
 class Grid:
-    def __init__(self, width, height):
+    """Visited cells stored in a single flat bytearray, one byte per cell. A cell holds
+    0 when free, or the owner id of the cycle that marked it first. Rows are exposed
+    through matrix as memoryviews, so matrix[y][x] reads work as before. cells can be
+    an existing writable buffer, such as shared memory, for a grid that is only read."""
+
+    def __init__(self, width, height, track_rays=True, cells=None):
         self.width = width
         self.height = height
+        self.cells = bytearray(width * height) if cells is None else cells
+        # Distance to the next obstacle for the bots, updated as cells are marked
+        self.rays = RayIndex(width, height) if track_rays else None
         self.matrix = self.create_grid()
+        # ctypes view used to clear the cells in place
+        self.buffer = (ctypes.c_ubyte * len(self.cells)).from_buffer(self.cells)
+        self.array = None
+        if numpy is not None:
+            self.array = numpy.frombuffer(self.cells, dtype=numpy.uint8).reshape(
+                height, width
+            )
+        # sweep needs numpy
+        self.can_sweep = self.array is not None
 
     def create_grid(self):
-        return [[0 for x in range(self.width)] for y in range(self.height)]
+        view = memoryview(self.cells)
+        return [
+            view[y * self.width : (y + 1) * self.width] for y in range(self.height)
+        ]
+
+    def reset(self):
+        """Marks every cell as unvisited without reallocating."""
+        ctypes.memset(self.buffer, 0, len(self.cells))
+        if self.rays:
+            self.rays.clear()
+
+    def set_pos_to_visited(self, x, y, owner=1):
+        self.cells[y * self.width + x] = owner
+        if self.rays:
+            self.rays.mark_rect(x, y, x, y)
+
+    def mark_rect(self, x0, y0, x1, y1, owner=1):
+        """Marks every free cell in the inclusive rectangle for owner."""
+        table = FILL[owner]
+        for y in range(y0, y1 + 1):
+            start = y * self.width + x0
+            stop = y * self.width + x1 + 1
+            self.cells[start:stop] = self.cells[start:stop].translate(table)
+        if self.rays:
+            self.rays.mark_rect(x0, y0, x1, y1)
+
+    def erase_rect(self, x0, y0, x1, y1, owner):
+        """Frees the cells owner owns in the inclusive rectangle. Cells other cycles own
+        stay marked. Costs time proportional to the rectangle, not the grid."""
+        table = ERASE[owner]
+        survivors = []
+        for y in range(y0, y1 + 1):
+            start = y * self.width + x0
+            stop = y * self.width + x1 + 1
+            row = self.cells[start:stop].translate(table)
+            self.cells[start:stop] = row
+            if row.count(0) != len(row):
+                survivors.append((y, row))
+        if self.rays:
+            self.rays.unmark_rect(x0, y0, x1, y1)
+            # Put back what other cycles left inside the rectangle
+            for y, row in survivors:
+                for run in OCCUPIED.finditer(row):
+                    self.rays.mark_rect(x0 + run.start(), y, x0 + run.end() - 1, y)
+
+    def is_visited(self, x, y):
+        """Out of bounds coordinates count as visited."""
+        if x < 0 or y < 0 or x >= self.width or y >= self.height:
+            return True
+        return self.cells[y * self.width + x] != 0
+
+    def raycast(self, x, y, heading, limit=None):
+        """Returns the number of steps from x, y in heading to the first visited or out
+        of bounds cell. Without a ray index the cells are walked one at a time, giving up
+        after limit steps and returning limit + 1."""
+        if self.rays:
+            return self.rays.distance(x, y, heading)
+        dx, dy = constants.DELTAS[heading]
+        i = 1
+        while limit is None or i <= limit:
+            if self.is_visited(x + dx * i, y + dy * i):
+                return i
+            i += 1
+        return i
+
+    def sample(self, origin_x, origin_y, stride):
+        """Returns a coarse copy of the grid holding every stride-th cell in each
+        direction, on a lattice that passes through origin. Trails are 11 cells wide, so
+        a stride up to 11 cannot step over one. Returns (cells, width, height, x0, y0)
+        where x0, y0 is the fine coordinate of coarse cell 0, 0."""
+        x0 = origin_x % stride
+        y0 = origin_y % stride
+        # Strided memoryview slices work for any buffer, not only bytearrays
+        view = memoryview(self.cells)
+        rows = [
+            view[row + x0 : row + self.width : stride].tobytes()
+            for row in range(y0 * self.width, len(self.cells), stride * self.width)
+        ]
+        width = len(range(x0, self.width, stride))
+        return bytearray(b"".join(rows)), width, len(rows), x0, y0
+
+    def get_grid_coord(self, x, y):
+        x = int(x + self.width / 2)
+        y = int(y + self.height / 2)
+        return (x, y)
+
+    def set_adjacent_coords_as_visited(self, player, x, y, amount, owner=1):
+        """Sets adjecent coordinates to visited by specified amount."""
+        heading = player.heading()
+        table = FILL[owner]
+        if heading == constants.EAST or heading == constants.WEST:
+            # Vertical band, clipped to the grid
+            if not 0 <= x < self.width:
+                return
+            low = max(y - amount, 0)
+            high = min(y + amount, self.height - 1)
+            if low > high:
+                return
+            start = low * self.width + x
+            stop = high * self.width + x + 1
+            band = self.cells[start : stop : self.width]
+            self.cells[start : stop : self.width] = band.translate(table)
+            if self.rays:
+                self.rays.mark_rect(x, low, x, high)
+        elif heading == constants.NORTH or heading == constants.SOUTH:
+            # Horizontal band, clipped to the grid
+            if not 0 <= y < self.height:
+                return
+            low = max(x - amount, 0)
+            high = min(x + amount, self.width - 1)
+            if low > high:
+                return
+            row = y * self.width
+            band = self.cells[row + low : row + high + 1]
+            self.cells[row + low : row + high + 1] = band.translate(table)
+            if self.rays:
+                self.rays.mark_rect(low, y, high, y)
+
+    def fill(self, band, owner):
+        """Claims the free cells of a numpy view for owner."""
+        if band.any():
+            numpy.copyto(band, owner, where=band == 0)
+        else:
+            band.fill(owner)
+
+    def sweep(self, positions, heading, amount, owner=1):
+        """Checks and marks a whole straight run of positions at once (requires numpy).
+        Same result as checking each position in order and marking it and its adjacent
+        coordinates until the first collision. Returns the number of positions marked,
+        which is less than len(positions) if there was a collision."""
+        x, y = positions[0]
+        dx, dy = constants.DELTAS[heading]
+        if dx:
+            if not (0 <= y < self.height and 0 <= x < self.width):
+                return 0
+            # Positions still inside the grid
+            length = min(len(positions), self.width - x if dx > 0 else x + 1)
+            if dx > 0:
+                path = self.array[y, x : x + length]
+            else:
+                path = self.array[y, x - length + 1 : x + 1][::-1]
+        else:
+            if not (0 <= x < self.width and 0 <= y < self.height):
+                return 0
+            length = min(len(positions), self.height - y if dy > 0 else y + 1)
+            if dy > 0:
+                path = self.array[y : y + length, x]
+            else:
+                path = self.array[y - length + 1 : y + 1, x][::-1]
+
+        hits = numpy.flatnonzero(path)
+        count = int(hits[0]) if len(hits) else length
+        if count == 0:
+            return 0
+
+        # Mark the clear part of the path along with its adjacent band in one write
+        if dx:
+            low, high = (x, x + count - 1) if dx > 0 else (x - count + 1, x)
+            top, bottom = max(y - amount, 0), min(y + amount, self.height - 1)
+            self.fill(self.array[top : bottom + 1, low : high + 1], owner)
+            if self.rays:
+                self.rays.mark_rect(low, top, high, bottom)
+        else:
+            low, high = (y, y + count - 1) if dy > 0 else (y - count + 1, y)
+            left, right = max(x - amount, 0), min(x + amount, self.width - 1)
+            self.fill(self.array[low : high + 1, left : right + 1], owner)
+            if self.rays:
+                self.rays.mark_rect(left, low, right, high)
+        return count
+
+
+class SparseGrid:
+    """Visited cells for very large arenas. The arena is split into square tiles and a
+    tile's bytearray is only allocated once something is marked in it, so memory grows
+    with the trails rather than the area. Offers the same checks and marks as Grid,
+    except sample and erase_rect, so derez mode needs Grid."""
+
+    TILE = 64
+    can_sweep = True
+
+    def __init__(self, width, height, track_rays=True):
+        self.width = width
+        self.height = height
+        # (tile x, tile y) -> bytearray of TILE * TILE cells
+        self.tiles = {}
+        self.rays = RayIndex(width, height) if track_rays else None
+        self.array = None
 
-    def set_pos_to_visited(self, x, y):
-        self.matrix[y][x] = 1
+    def reset(self):
+        self.tiles.clear()
+        if self.rays:
+            self.rays.clear()
+
+    def is_visited(self, x, y):
+        """Out of bounds coordinates count as visited."""
+        if x < 0 or y < 0 or x >= self.width or y >= self.height:
+            return True
+        tile = self.tiles.get((x // self.TILE, y // self.TILE))
+        if tile is None:
+            return False
+        return tile[(y % self.TILE) * self.TILE + x % self.TILE] != 0
+
+    def mark_rect(self, x0, y0, x1, y1, owner=1):
+        """Marks every free cell in the inclusive rectangle for owner, clipped to the
+        arena."""
+        x0, y0 = max(x0, 0), max(y0, 0)
+        x1, y1 = min(x1, self.width - 1), min(y1, self.height - 1)
+        if x0 > x1 or y0 > y1:
+            return
+        size = self.TILE
+        for ty in range(y0 // size, y1 // size + 1):
+            for tx in range(x0 // size, x1 // size + 1):
+                tile = self.tiles.get((tx, ty))
+                if tile is None:
+                    tile = self.tiles[(tx, ty)] = bytearray(size * size)
+                # Part of the rectangle inside this tile, in tile coordinates
+                left = max(x0, tx * size) - tx * size
+                right = min(x1, tx * size + size - 1) - tx * size
+                for y in range(max(y0, ty * size), min(y1, ty * size + size - 1) + 1):
+                    start = (y - ty * size) * size + left
+                    stop = (y - ty * size) * size + right + 1
+                    tile[start:stop] = tile[start:stop].translate(FILL[owner])
+        if self.rays:
+            self.rays.mark_rect(x0, y0, x1, y1)
+
+    def set_pos_to_visited(self, x, y, owner=1):
+        self.mark_rect(x, y, x, y, owner)
+
+    def set_adjacent_coords_as_visited(self, player, x, y, amount, owner=1):
+        """Sets adjecent coordinates to visited by specified amount."""
+        heading = player.heading()
+        if heading == constants.EAST or heading == constants.WEST:
+            if 0 <= x < self.width:
+                self.mark_rect(x, y - amount, x, y + amount, owner)
+        elif heading == constants.NORTH or heading == constants.SOUTH:
+            if 0 <= y < self.height:
+                self.mark_rect(x - amount, y, x + amount, y, owner)
+
+    def sweep(self, positions, heading, amount, owner=1):
+        """Same as Grid.sweep, without numpy. Checks the run cell by cell, since a run
+        is only a few cells long, then marks it with its adjacent band in one call."""
+        count = 0
+        for x, y in positions:
+            if self.is_visited(x, y):
+                break
+            count += 1
+        if count:
+            (x0, y0), (x1, y1) = positions[0], positions[count - 1]
+            if heading == constants.EAST or heading == constants.WEST:
+                self.mark_rect(
+                    min(x0, x1), y0 - amount, max(x0, x1), y0 + amount, owner
+                )
+            else:
+                self.mark_rect(
+                    x0 - amount, min(y0, y1), x0 + amount, max(y0, y1), owner
+                )
+        return count
+
+    def raycast(self, x, y, heading, limit=None):
+        """Same as Grid.raycast."""
+        return Grid.raycast(self, x, y, heading, limit)
 
     def get_grid_coord(self, x, y):
         x = int(x + self.width / 2)
         y = int(y + self.height / 2)
         return (x, y)
 
-    def set_adjacent_coords_as_visited(self, player, x, y, amount):
+
+class SegmentGrid:
+    """Visited cells stored as thick axis aligned segments instead of cells. Runs along
+    a row (heading east or west) are intervals in the sets of the rows they cover, runs
+    along a column are intervals in the sets of the columns they cover. A run that keeps
+    its heading only grows intervals already stored, so memory and work follow the
+    number of turns rather than the arena area. Does not track owners, so derez mode
+    needs Grid."""
+
+    can_sweep = True
+    array = None
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.rows = {}
+        self.cols = {}
+        # Sorted keys of rows and cols, for raycasts across the other direction
+        self.row_keys = []
+        self.col_keys = []
+
+    def reset(self):
+        self.rows.clear()
+        self.cols.clear()
+        self.row_keys.clear()
+        self.col_keys.clear()
+
+    def add(self, lines, keys, first, last, low, high):
+        """Adds low..high to lines first..last, clipped to the grid."""
+        for i in range(first, last + 1):
+            line = lines.get(i)
+            if line is None:
+                line = lines[i] = IntervalSet()
+                insort(keys, i)
+            line.add(low, high)
+
+    def mark_rows(self, x0, y0, x1, y1):
+        x0, y0 = max(x0, 0), max(y0, 0)
+        x1, y1 = min(x1, self.width - 1), min(y1, self.height - 1)
+        if x0 <= x1 and y0 <= y1:
+            self.add(self.rows, self.row_keys, y0, y1, x0, x1)
+
+    def mark_cols(self, x0, y0, x1, y1):
+        x0, y0 = max(x0, 0), max(y0, 0)
+        x1, y1 = min(x1, self.width - 1), min(y1, self.height - 1)
+        if x0 <= x1 and y0 <= y1:
+            self.add(self.cols, self.col_keys, x0, x1, y0, y1)
+
+    def set_pos_to_visited(self, x, y, owner=1):
+        self.mark_rows(x, y, x, y)
+
+    def set_adjacent_coords_as_visited(self, player, x, y, amount, owner=1):
         """Sets adjecent coordinates to visited by specified amount."""
-        try:
-            for num in range(1, amount + 1):
-                if (
-                    player.heading() == constants.EAST
-                    or player.heading() == constants.WEST
-                ):
-                    self.set_pos_to_visited(x, y - num)
-                    self.set_pos_to_visited(x, y + num)
-                elif (
-                    player.heading() == constants.NORTH
-                    or player.heading() == constants.SOUTH
-                ):
-                    self.set_pos_to_visited(x + num, y)
-                    self.set_pos_to_visited(x - num, y)
-        except IndexError:
-            # Ignore out of bounds activations
-            pass
+        heading = player.heading()
+        if heading == constants.EAST or heading == constants.WEST:
+            if 0 <= x < self.width:
+                self.mark_rows(x, y - amount, x, y + amount)
+        elif heading == constants.NORTH or heading == constants.SOUTH:
+            if 0 <= y < self.height:
+                self.mark_cols(x - amount, y, x + amount, y)
+
+    def is_visited(self, x, y):
+        """Out of bounds coordinates count as visited."""
+        if x < 0 or y < 0 or x >= self.width or y >= self.height:
+            return True
+        row = self.rows.get(y)
+        if row is not None and row.contains(x):
+            return True
+        col = self.cols.get(x)
+        return col is not None and col.contains(y)
+
+    def raycast(self, x, y, heading, limit=None):
+        """Returns the number of steps from x, y in heading to the first visited or out
+        of bounds cell. With a limit, the search stops after limit steps and may return
+        limit + 1."""
+        if heading == constants.EAST or heading == constants.WEST:
+            along, across, size = self.rows, self.cols, self.width
+            keys, pos, line_idx = self.col_keys, x, y
+        else:
+            along, across, size = self.cols, self.rows, self.height
+            keys, pos, line_idx = self.row_keys, y, x
+        forward = heading == constants.EAST or heading == constants.NORTH
+        best = size - pos if forward else pos + 1
+        if limit is not None:
+            best = min(best, limit + 1)
+
+        # Runs along the same line
+        line = along.get(line_idx)
+        if line is not None:
+            if forward:
+                hit = line.next_at_or_after(pos + 1)
+                if hit is not None:
+                    best = min(best, hit - pos)
+            else:
+                hit = line.prev_at_or_before(pos - 1)
+                if hit is not None:
+                    best = min(best, pos - hit)
+
+        # Runs across the line, nearest first
+        if forward:
+            i = bisect_right(keys, pos)
+            while i < len(keys) and keys[i] - pos < best:
+                if across[keys[i]].contains(line_idx):
+                    return keys[i] - pos
+                i += 1
+        else:
+            i = bisect_left(keys, pos) - 1
+            while i >= 0 and pos - keys[i] < best:
+                if across[keys[i]].contains(line_idx):
+                    return pos - keys[i]
+                i -= 1
+        return best
+
+    def sweep(self, positions, heading, amount, owner=1):
+        """Same as Grid.sweep. The run is checked with one raycast and marked by
+        growing one interval per covered row or column."""
+        x, y = positions[0]
+        if self.is_visited(x, y):
+            return 0
+        count = min(len(positions), self.raycast(x, y, heading, len(positions)))
+        (x0, y0), (x1, y1) = positions[0], positions[count - 1]
+        if heading == constants.EAST or heading == constants.WEST:
+            self.mark_rows(min(x0, x1), y0 - amount, max(x0, x1), y0 + amount)
+        else:
+            self.mark_cols(x0 - amount, min(y0, y1), x0 + amount, max(y0, y1))
+        return count
+
+    def sample(self, origin_x, origin_y, stride):
+        """Same as Grid.sample, built from the stored intervals."""
+        x0 = origin_x % stride
+        y0 = origin_y % stride
+        width = len(range(x0, self.width, stride))
+        height = len(range(y0, self.height, stride))
+        cells = bytearray(width * height)
+        for lines, offset, step, count, origin in (
+            (self.rows, x0, 1, width, y0),
+            (self.cols, y0, width, height, x0),
+        ):
+            for i, line in lines.items():
+                if (i - origin) % stride:
+                    continue
+                base = (i - origin) // stride * (width if step == 1 else 1)
+                for low, high in zip(line.starts, line.ends):
+                    # Lattice points inside low..high
+                    first = max(-(-(low - offset) // stride), 0)
+                    last = min((high - offset) // stride, count - 1)
+                    if first <= last:
+                        start = base + first * step
+                        stop = base + last * step + 1
+                        cells[start:stop:step] = b"\x01" * (last - first + 1)
+        return cells, width, height, x0, y0
+
+    def get_grid_coord(self, x, y):
+        x = int(x + self.width / 2)
+        y = int(y + self.height / 2)
+        return (x, y)
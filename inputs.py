@@ -0,0 +1,79 @@
+import collections
+
+
+class InputQueue:
+    """Direction keypresses for one player, buffered with the time they arrived. The
+    engine applies at most one per tick, at the start of the tick. Applied timestamps
+    are kept until the next drawn frame so input latency can be measured. When
+    max_pending keypresses are waiting, new ones are refused and counted in dropped,
+    so the turns pressed first still happen."""
+
+    def __init__(self, max_pending=4):
+        self.pending = collections.deque()
+        self.max_pending = max_pending
+        self.dropped = 0
+        self.applied = []
+
+    def push(self, dir, timestamp):
+        if len(self.pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self.pending.append((dir, timestamp))
+
+    def pop(self):
+        """Returns the oldest pending direction, or None if there is none."""
+        if not self.pending:
+            return None
+        dir, timestamp = self.pending.popleft()
+        self.applied.append(timestamp)
+        return dir
+
+    def drain_applied(self):
+        """Returns and forgets the timestamps of inputs applied since the last call."""
+        applied = self.applied
+        self.applied = []
+        return applied
+
+    def clear(self):
+        self.pending.clear()
+
+
+class LatencyHistogram:
+    """Counts latencies in fixed width millisecond buckets. The last bucket also holds
+    everything slower."""
+
+    def __init__(self, bucket_ms=2, buckets=50):
+        self.bucket_ms = bucket_ms
+        self.counts = [0] * buckets
+        self.total = 0
+
+    def add(self, seconds):
+        bucket = min(int(seconds * 1000 / self.bucket_ms), len(self.counts) - 1)
+        self.counts[bucket] += 1
+        self.total += 1
+
+    def percentile(self, p):
+        """Upper edge in ms of the bucket holding the p-th percentile."""
+        if not self.total:
+            return 0
+        target = self.total * p / 100
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return (bucket + 1) * self.bucket_ms
+        return len(self.counts) * self.bucket_ms
+
+    def report(self):
+        """Returns the histogram as text lines, one per non empty bucket."""
+        lines = [
+            f"input latency: {self.total} inputs, "
+            f"p50 {self.percentile(50)} ms, p99 {self.percentile(99)} ms"
+        ]
+        widest = max(self.counts) or 1
+        for bucket, count in enumerate(self.counts):
+            if count:
+                low = bucket * self.bucket_ms
+                bar = "#" * max(1, count * 40 // widest)
+                lines.append(f"{low:4d}-{low + self.bucket_ms:<4d} ms {count:6d} {bar}")
+        return lines
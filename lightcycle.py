@@ -0,0 +1,42 @@
+import turtle
+
+from trail import Trail
+
+
+class Lightcycle(turtle.Turtle):
+    """Draws a player's light cycle and trail. Follows the player's position every
+    time sync is called. The turtle pen stays up, the trail is drawn by Trail."""
+
+    def __init__(self, player):
+        super(Lightcycle, self).__init__()
+        self.player = player
+        self.penup()
+        self.shape("square")
+        self.color(player.color)
+        self.shapesize(stretch_wid=0.2, stretch_len=0.8, outline=None)
+        self.speed(0)
+        self.setheading(player.heading())
+        self.setposition(player.xcor(), player.ycor())
+        self.trail = Trail(self.getscreen(), player.color)
+        self.trail.start(player.xcor(), player.ycor())
+
+    def sync(self):
+        """Moves the light cycle to the player's current position."""
+        if self.player.status == self.player.DEAD:
+            return
+        x, y = self.player.position()
+        self.setheading(self.player.heading())
+        self.setposition(x, y)
+        self.trail.extend(x, y, self.player.heading())
+
+    def clear_lightcycle(self):
+        """Removes light cycle and its whole trail from screen"""
+        self.hideturtle()
+        self.trail.clear()
+
+    def respawn(self):
+        """Moves light cycle to the player's respawn position without drawing."""
+        self.setheading(self.player.heading())
+        self.setposition(self.player.xcor(), self.player.ycor())
+        self.trail.start(self.player.xcor(), self.player.ycor())
+        self.showturtle()
@@ -1,19 +1,19 @@
 #!/usr/bin/env python3
+from assets import StartupTimer
+
+startup_timer = StartupTimer()
+
+import argparse
 import turtle
-import os
 import sys
 
-from game import Game
-from sound import Sound
+from assets import AssetCache
+from sound import Sound, close_audio_engine
 from screen import Screen
 from option_screen import OptionsScreen
 
-if os.name == "nt":
-    import winsound
-
-main_screen = Screen("main")
-options_screen = OptionsScreen("options")
-controls_screen = Screen("controls")
+# Menu screens in display order, built the first time they are shown
+SCREEN_TYPES = [("main", Screen), ("options", OptionsScreen), ("controls", Screen)]
 
 
 class MainMenu:
@@ -23,14 +23,16 @@ class MainMenu:
     GAME = "GAME"
     QUIT = "QUIT"
 
-    def __init__(self, testing=False):
+    def __init__(self, testing=False, timer=None):
         turtle.setundobuffer(None)
         turtle.tracer(0)
         self.testing = testing
+        self.timer = timer
         self.window_width, self.window_height = (1.0, 1.0)
         self.screen_idx = 0
-        self.screens = [main_screen, options_screen, controls_screen]
+        self.screens = [None] * len(SCREEN_TYPES)
         self.screen = turtle.Screen()
+        self.assets = AssetCache(self.screen)
         self.init_screen()
         self.audio = Sound()
         self.create_cursor()
@@ -40,9 +42,7 @@ class MainMenu:
 
     def init_screen(self):
         """Create maximized main menu screen."""
-        bg = self.get_curr_screen().bg
         self.screen.bgcolor("black")
-        self.screen.bgpic(bg)
         self.screen.setup(self.window_width, self.window_height)
         self.screen.title("TURTLETRON")
         self.screen.tracer(0)
@@ -56,47 +56,67 @@ class MainMenu:
         self.cursor.showturtle()
 
     def get_options_screen(self):
-        return self.screens[1]
+        return self.get_screen(1)
 
     def set_cursor_controller(self):
-        """Runs in start menu loop."""
+        """Moves the cursor to the current screen's cursor position and redraws."""
         curr_screen = self.get_curr_screen()
         cursor_pos = curr_screen.get_cursor_pos()
         self.cursor.setpos(cursor_pos)
+        self.screen.update()
+
+    def redraw_after(self, action):
+        """Wraps a key handler so the menu is only redrawn after a key press."""
+
+        def handler():
+            action()
+            if self.state == self.MENU:
+                self.set_cursor_controller()
+
+        return handler
 
     def set_keyboard_bindings(self):
-        """Sets bindings depending on which screen is displayed. Either player can control cursor. """
+        """Sets bindings depending on which screen is displayed. Either player can control cursor.
+        Only runs when the displayed screen changes."""
         turtle.listen()
         curr_screen = self.get_curr_screen()
+        cursor_up = self.redraw_after(curr_screen.cursor_up)
+        cursor_down = self.redraw_after(curr_screen.cursor_down)
 
         if curr_screen.name == "main":
-            turtle.onkeypress(curr_screen.cursor_up, "Up")
-            turtle.onkeypress(curr_screen.cursor_up, "w")
-            turtle.onkeypress(curr_screen.cursor_down, "Down")
-            turtle.onkeypress(curr_screen.cursor_down, "s")
+            turtle.onkeypress(cursor_up, "Up")
+            turtle.onkeypress(cursor_up, "w")
+            turtle.onkeypress(cursor_down, "Down")
+            turtle.onkeypress(cursor_down, "s")
             turtle.onkeypress(None, "a")
             turtle.onkeypress(None, "d")
             turtle.onkeypress(None, "Left")
             turtle.onkeypress(None, "Right")
         elif curr_screen.name == "controls":
-            turtle.onkeypress(curr_screen.cursor_up, "Right")
-            turtle.onkeypress(curr_screen.cursor_up, "d")
-            turtle.onkeypress(curr_screen.cursor_down, "Left")
-            turtle.onkeypress(curr_screen.cursor_down, "a")
+            turtle.onkeypress(cursor_up, "Right")
+            turtle.onkeypress(cursor_up, "d")
+            turtle.onkeypress(cursor_down, "Left")
+            turtle.onkeypress(cursor_down, "a")
+            turtle.onkeypress(None, "Up")
+            turtle.onkeypress(None, "w")
+            turtle.onkeypress(None, "Down")
+            turtle.onkeypress(None, "s")
         elif curr_screen.name == "options":
-            turtle.onkeypress(curr_screen.cursor_up, "Up")
-            turtle.onkeypress(curr_screen.cursor_up, "w")
-            turtle.onkeypress(curr_screen.cursor_down, "Down")
-            turtle.onkeypress(curr_screen.cursor_down, "s")
-            turtle.onkeypress(curr_screen.decrement_value, "a")
-            turtle.onkeypress(curr_screen.increment_value, "d")
-            turtle.onkeypress(curr_screen.decrement_value, "Left")
-            turtle.onkeypress(curr_screen.increment_value, "Right")
+            decrement_value = self.redraw_after(curr_screen.decrement_value)
+            increment_value = self.redraw_after(curr_screen.increment_value)
+            turtle.onkeypress(cursor_up, "Up")
+            turtle.onkeypress(cursor_up, "w")
+            turtle.onkeypress(cursor_down, "Down")
+            turtle.onkeypress(cursor_down, "s")
+            turtle.onkeypress(decrement_value, "a")
+            turtle.onkeypress(increment_value, "d")
+            turtle.onkeypress(decrement_value, "Left")
+            turtle.onkeypress(increment_value, "Right")
 
         # Apply special function to return or space
         turtle.onkeypress(self.handle_enter_or_space_controller, "Return")
         turtle.onkeypress(self.handle_enter_or_space_controller, "space")
-        turtle.onkeypress(self.prev_screen, "Escape")
+        turtle.onkeypress(self.redraw_after(self.prev_screen), "Escape")
 
     def next_screen(self):
         self.screen_idx += 1
@@ -112,14 +132,23 @@ class MainMenu:
             self.screen_idx -= 1
             self.display_controller()
 
+    def get_screen(self, idx):
+        if self.screens[idx] is None:
+            name, screen_type = SCREEN_TYPES[idx]
+            self.screens[idx] = screen_type(name)
+        return self.screens[idx]
+
     def get_curr_screen(self):
-        return self.screens[self.screen_idx]
+        return self.get_screen(self.screen_idx)
 
     def display_controller(self):
+        """Draws the current screen and installs its key bindings."""
         curr_screen = self.get_curr_screen()
-        self.screen.bgpic(curr_screen.bg)
+        self.assets.set_background(curr_screen.bg)
         if curr_screen.name == "options":
             curr_screen.draw_option_values()
+        self.set_keyboard_bindings()
+        self.set_cursor_controller()
 
     def handle_enter_or_space_controller(self):
         """Depending on the current screen, passes the action to its corresponding function."""
@@ -130,21 +159,23 @@ class MainMenu:
             "controls": self.handle_enter_or_space_controls,
         }
         handler_map[curr_screen]()
+        if self.state == self.MENU:
+            self.set_cursor_controller()
 
     def handle_enter_or_space_main(self):
         """Controls how enter or space function depending on the cursor position for the main screen."""
         cursor_idx = self.get_curr_screen().curr_cursor_idx
         if cursor_idx == 4:  # 1P Start
-            self.screen.clear()
-            self.state = self.GAME
+            self.humans = 1
+            self.launch_game()
         elif cursor_idx == 3:  # 2P Start
             self.humans = 2
-            self.screen.clear()
-            self.state = self.GAME
+            self.launch_game()
         elif cursor_idx == 2:  # Options
             self.next_screen()
         elif cursor_idx == 1:
             self.state = self.QUIT
+            self.quit()
 
     def handle_enter_or_space_controls(self):
         """Controls how enter or space function depending on the cursor position for the controls screen. """
@@ -157,46 +188,78 @@ class MainMenu:
             curr_screen.text_pen.clear()
             self.next_screen()
 
+    def launch_game(self):
+        """Clears the menu and its key bindings, then starts the game from the event loop."""
+        if self.timer:
+            self.timer.mark("game_launched")
+        self.screen.clear()
+        self.state = self.GAME
+        self.screen.ontimer(self.start_game, 0)
+
+    def start_game(self):
+        # The game modules are only needed once a match starts
+        from game import Game
+
+        self.audio.stop_music()
+        # Trim options dict to only contain name and value
+        options = {
+            key: value["value"]
+            for key, value in self.get_options_screen().options.items()
+        }
+        gameObj = Game(**options, humans=self.humans, testing=self.testing)
+        gameObj.start_game(on_end=self.reset_menu)
+        if self.timer:
+            self.timer.mark("game_first_frame")
+            self.report_startup()
+
+    def report_startup(self):
+        """Prints the startup timings and closes the window."""
+        self.timer.report()
+        menu_to_game = self.timer.elapsed("game_launched", "game_first_frame")
+        print(f"{'menu_to_game':<20} {menu_to_game * 1000:8.1f} ms")
+        print(f"{'image_decoding':<20} {self.assets.decode_time * 1000:8.1f} ms")
+        self.quit()
+
     def reset_menu(self):
+        self.state = self.MENU
         self.audio.stop_music()
         self.init_screen()
-        self.display_controller()
         self.create_cursor()
+        self.display_controller()
         if not self.testing:
             self.audio.start_music("main_menu")
 
     def start_menu(self):
-        """Main menu loop."""
+        """Starts the menu music and hands control to the Tk event loop. Key presses
+        and game frames run as events until the window is closed or Quit is picked."""
         if not self.testing:
             self.audio.start_music("main_menu")
-
-        # Change cursor position based on keybindings
-        while self.state == self.MENU:
-            self.set_cursor_controller()
-            self.set_keyboard_bindings()
+        if self.timer:
+            # Measure the first drawn menu frame, then start a match straight away
             self.screen.update()
-            while self.state == self.GAME:
-                self.audio.stop_music()
-                # Trim options dict to only contain name and value
-                options = {
-                    key: value["value"]
-                    for key, value in self.get_options_screen().options.items()
-                }
-                gameObj = Game(**options, humans=self.humans, testing=self.testing)
-                gameObj.start_game()
-                self.state = self.MENU
-                self.reset_menu()
-
-        if self.state == self.QUIT:
-            self.quit()
+            self.timer.mark("menu_first_frame")
+            self.screen.ontimer(self.launch_game, 0)
+        self.screen.mainloop()
 
     def quit(self):
-        self.audio.stop_music()
+        # Stop the music player before exiting, the audio thread dies with the process
+        close_audio_engine()
         turtle.bye()
 
 
 if __name__ == "__main__":
     if sys.version_info[0] < 3:
         raise SystemExit("Python 3 required!")
-    menu = MainMenu()
+    parser = argparse.ArgumentParser(description="TurtleTron")
+    parser.add_argument(
+        "--startup_time",
+        action="store_true",
+        help="Print cold start and menu-to-game timings, then exit",
+    )
+    args = parser.parse_args()
+    timer = None
+    if args.startup_time:
+        timer = startup_timer
+        timer.mark("imports_done")
+    menu = MainMenu(testing=args.startup_time, timer=timer)
     menu.start_menu()
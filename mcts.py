@@ -0,0 +1,234 @@
+import atexit
+import math
+import multiprocessing
+import random
+import time
+import constants
+
+from ai import SpaceAi
+
+# Relative moves, in degrees added to the current heading
+STRAIGHT, LEFT, RIGHT = 0, 90, -90
+MOVES = (STRAIGHT, LEFT, RIGHT)
+
+pool = None
+
+
+def get_pool(workers):
+    """Worker processes are shared by every MctsAi and started on first use. They are
+    spawned, not forked, so they do not inherit the window's Tk state."""
+    global pool
+    if pool is None:
+        pool = multiprocessing.get_context("spawn").Pool(workers)
+        atexit.register(close_pool)
+    return pool
+
+
+def close_pool():
+    """Stops the worker processes, if they were started."""
+    global pool
+    if pool is not None:
+        pool.terminate()
+        pool.join()
+        pool = None
+
+
+class Snapshot:
+    """Cheap, picklable copy of a match for planning. The grid is a coarse lattice
+    (see Grid.sample) and every cycle moves one lattice cell per step, so speed
+    differences are ignored. Cycle 0 is the planning bot."""
+
+    def __init__(self, cells, width, height, cycles):
+        self.cells = cells
+        self.width = width
+        self.height = height
+        # [column, row, heading, alive] per cycle
+        self.cycles = cycles
+
+    @classmethod
+    def capture(cls, grid, me, players, stride):
+        x, y = grid.get_grid_coord(me.xcor(), me.ycor())
+        cells, width, height, x0, y0 = grid.sample(x, y, stride)
+        cycles = [[(x - x0) // stride, (y - y0) // stride, me.heading(), True]]
+        for other in players:
+            if other is not me and other.status == other.READY:
+                ox, oy = grid.get_grid_coord(other.xcor(), other.ycor())
+                col = min(max((ox - x0 + stride // 2) // stride, 0), width - 1)
+                row = min(max((oy - y0 + stride // 2) // stride, 0), height - 1)
+                cycles.append([col, row, other.heading(), True])
+        return cls(cells, width, height, cycles)
+
+    def copy(self):
+        return Snapshot(
+            bytearray(self.cells),
+            self.width,
+            self.height,
+            [list(cycle) for cycle in self.cycles],
+        )
+
+    def is_free(self, col, row):
+        return (
+            0 <= col < self.width
+            and 0 <= row < self.height
+            and not self.cells[row * self.width + col]
+        )
+
+    def free_moves(self, cycle):
+        col, row, heading, alive = cycle
+        moves = []
+        for move in MOVES:
+            dx, dy = constants.DELTAS[(heading + move) % 360]
+            if self.is_free(col + dx, row + dy):
+                moves.append(move)
+        return moves
+
+    def step(self, moves):
+        """Moves every live cycle one cell. moves holds one relative move per cycle.
+        Cycles entering a taken cell, or the same cell as another cycle, crash."""
+        claimed = {}
+        for i, cycle in enumerate(self.cycles):
+            col, row, heading, alive = cycle
+            if not alive:
+                continue
+            # Leave a trail in the cell being exited
+            self.cells[row * self.width + col] = 1
+            heading = (heading + moves[i]) % 360
+            dx, dy = constants.DELTAS[heading]
+            col, row = col + dx, row + dy
+            cycle[:3] = col, row, heading
+            if not self.is_free(col, row):
+                cycle[3] = False
+            elif (col, row) in claimed:
+                cycle[3] = False
+                self.cycles[claimed[col, row]][3] = False
+            else:
+                claimed[col, row] = i
+
+
+class Node:
+    def __init__(self):
+        self.children = {}
+        self.visits = 0
+        self.value = 0.0
+
+
+def opponent_move(snapshot, cycle, rng):
+    """Opponents keep going straight until blocked, then turn to a free side."""
+    moves = snapshot.free_moves(cycle)
+    if not moves or STRAIGHT in moves:
+        return STRAIGHT
+    return rng.choice(moves)
+
+
+def simulate(snapshot, my_moves, horizon, rng):
+    """Plays my_moves, then random safe moves, for up to horizon steps. Reward is the
+    fraction of the horizon survived, plus a bonus for opponents that crash."""
+    steps = 0
+    while steps < horizon and snapshot.cycles[0][3]:
+        moves = [STRAIGHT] * len(snapshot.cycles)
+        if steps < len(my_moves):
+            moves[0] = my_moves[steps]
+        else:
+            free = snapshot.free_moves(snapshot.cycles[0])
+            moves[0] = rng.choice(free) if free else STRAIGHT
+        for i in range(1, len(snapshot.cycles)):
+            if snapshot.cycles[i][3]:
+                moves[i] = opponent_move(snapshot, snapshot.cycles[i], rng)
+        snapshot.step(moves)
+        steps += 1
+    crashed = sum(1 for cycle in snapshot.cycles[1:] if not cycle[3])
+    return steps / horizon + 0.1 * crashed
+
+
+def search(snapshot, budget, horizon, seed, playouts=None, exploration=1.4):
+    """Open loop UCT over the planning bot's moves until budget seconds have passed,
+    or for exactly playouts playouts if given. Returns {move: [visits, total value]}
+    for the root moves."""
+    deadline = time.perf_counter() + budget
+    rng = random.Random(seed)
+    root = Node()
+    while (
+        time.perf_counter() < deadline if playouts is None else root.visits < playouts
+    ):
+        node = root
+        path = [root]
+        moves = []
+        # Select down the tree, expanding the first untried move
+        while len(moves) < horizon:
+            untried = [move for move in MOVES if move not in node.children]
+            if untried:
+                move = rng.choice(untried)
+                node.children[move] = Node()
+                moves.append(move)
+                path.append(node.children[move])
+                break
+            log_visits = math.log(node.visits)
+            move, node = max(
+                node.children.items(),
+                key=lambda item: item[1].value / item[1].visits
+                + exploration * math.sqrt(log_visits / item[1].visits),
+            )
+            moves.append(move)
+            path.append(node)
+        reward = simulate(snapshot.copy(), moves, horizon, rng)
+        for visited in path:
+            visited.visits += 1
+            visited.value += reward
+    return {move: [child.visits, child.value] for move, child in root.children.items()}
+
+
+class MctsAi(SpaceAi):
+    """Fifth difficulty tier. Plans with Monte Carlo tree search over a Snapshot of the
+    match, within time_budget seconds per decision. With workers set, the same search
+    also runs in that many worker processes and the root statistics are merged. Results
+    that miss the deadline are ignored. Game sets workers, see --mcts_workers in
+    game.py. Rollouts are seeded from the match's rng. How far a search gets in the
+    time budget still depends on the machine, so with playouts set each search runs
+    exactly that many playouts instead and a seed replays the same match."""
+
+    horizon = 30
+    time_budget = 0.008
+    workers = 0
+    playouts = None
+
+    def choose_direction(self, grid, players, x, y):
+        snapshot = Snapshot.capture(grid, self, players, self.stride)
+        deadline = time.perf_counter() + self.time_budget
+        pending = []
+        if self.workers:
+            workers = get_pool(self.workers)
+            pending = [
+                workers.apply_async(
+                    search,
+                    (
+                        snapshot,
+                        self.time_budget,
+                        self.horizon,
+                        self.rng.random(),
+                        self.playouts,
+                    ),
+                )
+                for _ in range(self.workers)
+            ]
+
+        stats = search(
+            snapshot, self.time_budget, self.horizon, self.rng.random(), self.playouts
+        )
+        for result in pending:
+            try:
+                # Fixed playouts wait for every worker, so the result does not depend
+                # on timing
+                remaining = None
+                if self.playouts is None:
+                    remaining = max(deadline - time.perf_counter(), 0) + 0.002
+                for move, (visits, value) in result.get(remaining).items():
+                    stats.setdefault(move, [0, 0.0])
+                    stats[move][0] += visits
+                    stats[move][1] += value
+            except multiprocessing.TimeoutError:
+                pass
+
+        if not stats:
+            return self.heading()
+        move = max(stats, key=lambda move: (stats[move][0], move == STRAIGHT))
+        return (self.heading() + move) % 360
@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""Network multiplayer over TCP. One process is the server and runs the only Engine,
+every player runs a client that sends its key presses and draws what the server sends.
+
+    $ python3 netplay.py server --clients 2 --bots 1    # waits for 2 clients
+    $ python3 netplay.py client --host 192.168.1.20     # on each player's machine
+
+The match runs in lockstep. A client sends one input message every tick, stamped
+with the tick it is meant for, whether or not the server has answered the last one.
+The server buffers the inputs by tick and steps the engine once every client has sent
+its input for that tick, or after input_timeout; a late client has sent no input for
+that tick, and one that misses max_missed ticks in a row is dropped. The server then
+sends back the tick's changes: each player that moved, with its new position (the
+swept segment ends there), plus crashes and respawns with lives. A tick costs a few
+bytes per moving player whatever the size of the grid.
+"""
+import argparse
+import collections
+import select
+import socket
+import struct
+import sys
+
+import constants
+
+from engine import Engine
+from player import Player
+from scheduler import Scheduler
+
+DEFAULT_PORT = 5555
+# Every message is sent with its length in front
+LENGTH = struct.Struct(">I")
+# Type, player index, grid size, width, height, x boundary, y boundary, players
+HELLO = struct.Struct(">cBBHHHHB")
+# Index, x, y, dir index, lives
+PLAYER = struct.Struct(">BhhBB")
+# Type, tick, dir index
+INPUT = struct.Struct(">cIB")
+# Type, tick, flags, winner index, records
+TICK = struct.Struct(">cIBBB")
+# Player index, x, y, dir index, kind, lives
+RECORD = struct.Struct(">BhhBBB")
+DIRS = [constants.EAST, constants.NORTH, constants.WEST, constants.SOUTH]
+NO_INPUT = 255
+NO_WINNER = 255
+
+# Record kinds
+MOVE = 0
+CRASH = 1
+RESPAWN = 2
+
+# Tick flags
+ROUND_RESET = 1
+GAME_OVER = 2
+
+
+class Connection:
+    """Length prefixed messages over a TCP socket."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.buffer = bytearray()
+        self.closed = False
+
+    def send(self, payload):
+        self.sock.sendall(LENGTH.pack(len(payload)) + payload)
+
+    def next_message(self):
+        if len(self.buffer) < LENGTH.size:
+            return None
+        (length,) = LENGTH.unpack_from(self.buffer)
+        end = LENGTH.size + length
+        if len(self.buffer) < end:
+            return None
+        payload = bytes(self.buffer[LENGTH.size : end])
+        del self.buffer[:end]
+        return payload
+
+    def receive(self, timeout=None):
+        """Returns the next message, or None if none arrived within timeout seconds.
+        A timeout of None waits until a message or the connection closes."""
+        while True:
+            message = self.next_message()
+            if message is not None or self.closed:
+                return message
+            ready, _, _ = select.select([self.sock], [], [], timeout)
+            if not ready:
+                return None
+            try:
+                data = self.sock.recv(65536)
+            except OSError:
+                # Reset by the other end
+                data = b""
+            if not data:
+                self.closed = True
+            self.buffer += data
+
+    def close(self):
+        self.sock.close()
+        self.closed = True
+
+
+def encode_player(idx, player):
+    return PLAYER.pack(
+        idx, player.xcor(), player.ycor(), DIRS.index(player.heading()), player.lives
+    )
+
+
+class Server:
+    """Runs the match. Clients control the first len(connections) players. A tick
+    waits at most input_timeout seconds, and never more than one tick interval, for
+    the clients' inputs, so one stalled client cannot freeze the match. late_inputs
+    counts the inputs that missed it. A client that misses max_missed ticks in a row
+    is disconnected."""
+
+    def __init__(
+        self,
+        engine,
+        connections,
+        tick_rate=constants.TICK_RATE,
+        input_timeout=None,
+        max_missed=constants.TICK_RATE,
+    ):
+        self.engine = engine
+        self.connections = connections
+        self.scheduler = Scheduler(tick_rate, tick_rate)
+        interval = self.scheduler.tick_interval
+        self.input_timeout = min(input_timeout or interval, interval)
+        self.max_missed = max_missed
+        self.late_inputs = 0
+        # Per client: buffered (tick, dir index) inputs, the latest tick it has sent
+        # an input for and how many ticks in a row it has missed
+        self.pending = [collections.deque() for _ in connections]
+        self.latest = [-1] * len(connections)
+        self.missed = [0] * len(connections)
+        self.sent_pos = [player.position() for player in engine.players]
+        self.bytes_sent = 0
+
+    def send_hello(self):
+        engine = self.engine
+        for idx, connection in enumerate(self.connections):
+            payload = bytearray(
+                HELLO.pack(
+                    b"H",
+                    idx,
+                    engine.grid_size,
+                    engine.width,
+                    engine.height,
+                    engine.x_boundary,
+                    engine.y_boundary,
+                    len(engine.players),
+                )
+            )
+            for i, player in enumerate(engine.players):
+                payload += encode_player(i, player)
+                for text in (player.name, player.color):
+                    data = text.encode()
+                    payload += bytes([len(data)]) + data
+            connection.send(bytes(payload))
+
+    def collect_inputs(self):
+        """Applies every connected client's buffered inputs up to this tick. Waits
+        until the timeout for a client that has sent nothing for this tick yet. Inputs
+        stamped for later ticks stay buffered."""
+        tick = self.engine.tick
+        deadline = self.scheduler.clock() + self.input_timeout
+        for idx, connection in enumerate(self.connections):
+            pending = self.pending[idx]
+            arrived = False
+            while not connection.closed:
+                # Only wait while this client has sent nothing for this tick
+                caught_up = arrived or self.latest[idx] >= tick
+                timeout = 0 if caught_up else max(deadline - self.scheduler.clock(), 0)
+                message = connection.receive(timeout)
+                if message is None:
+                    break
+                _, stamp, dir_idx = INPUT.unpack(message)
+                pending.append((stamp, dir_idx))
+                self.latest[idx] = max(self.latest[idx], stamp)
+                arrived = True
+            if connection.closed:
+                continue
+            if arrived or self.latest[idx] >= tick:
+                self.missed[idx] = 0
+            else:
+                self.late_inputs += 1
+                self.missed[idx] += 1
+                if self.missed[idx] >= self.max_missed:
+                    # Stalled for too long, stop waiting on it
+                    connection.close()
+            while pending and pending[0][0] <= tick:
+                _, dir_idx = pending.popleft()
+                if dir_idx != NO_INPUT:
+                    self.engine.players[idx].inputs.push(DIRS[dir_idx], 0)
+
+    def encode_tick(self, round_before):
+        engine = self.engine
+        flags = 0
+        winner_idx = NO_WINNER
+        records = bytearray()
+        count = 0
+
+        def add(idx, player, kind, x, y):
+            nonlocal count
+            records.extend(
+                RECORD.pack(idx, x, y, DIRS.index(player.heading()), kind, player.lives)
+            )
+            count += 1
+
+        for crashed in engine.crashed:
+            idx = engine.players.index(crashed)
+            add(idx, crashed, CRASH, *crashed.crash_pos)
+        if engine.round != round_before:
+            flags |= ROUND_RESET
+        for idx, player in enumerate(engine.players):
+            if player.status == player.DEAD:
+                continue
+            pos = player.position()
+            if flags & ROUND_RESET:
+                add(idx, player, RESPAWN, *pos)
+            elif pos != self.sent_pos[idx]:
+                add(idx, player, MOVE, *pos)
+            self.sent_pos[idx] = pos
+        if not engine.game_on:
+            flags |= GAME_OVER
+            winner = engine.get_winner()
+            if winner:
+                winner_idx = engine.players.index(winner)
+        return TICK.pack(b"T", engine.tick, flags, winner_idx, count) + bytes(records)
+
+    def run(self, max_ticks=None):
+        """Plays the match to the end. Returns the winner."""
+        self.send_hello()
+        self.scheduler.start()
+        while self.engine.game_on and (max_ticks is None or self.engine.tick < max_ticks):
+            self.collect_inputs()
+            round_before = self.engine.round
+            self.engine.step()
+            for player in self.engine.players:
+                player.inputs.drain_applied()
+            payload = self.encode_tick(round_before)
+            self.bytes_sent += LENGTH.size + len(payload)
+            for connection in self.connections:
+                if not connection.closed:
+                    try:
+                        connection.send(payload)
+                    except OSError:
+                        connection.closed = True
+            # Never run faster than the tick rate, even when every client is quick
+            while not self.scheduler.ticks_due(self.scheduler.clock()):
+                self.scheduler.wait()
+        for connection in self.connections:
+            connection.close()
+        return self.engine.get_winner()
+
+
+class RemoteEngine:
+    """Stands in for an Engine on a client, so Game can draw a networked match. step
+    sends the local player's input for the next tick and applies the ticks the server
+    has sent since."""
+
+    def __init__(self, host, port=DEFAULT_PORT):
+        self.connection = Connection(socket.create_connection((host, port)))
+        hello = self.connection.receive()
+        (
+            _,
+            self.player_idx,
+            self.grid_size,
+            self.width,
+            self.height,
+            self.x_boundary,
+            self.y_boundary,
+            count,
+        ) = HELLO.unpack_from(hello)
+        pos = HELLO.size
+        self.players = []
+        for _ in range(count):
+            idx, x, y, dir_idx, lives = PLAYER.unpack_from(hello, pos)
+            pos += PLAYER.size
+            name, color = [], []
+            for text in (name, color):
+                length = hello[pos]
+                text.append(hello[pos + 1 : pos + 1 + length].decode())
+                pos += 1 + length
+            player = Player(name[0], x, y, color[0])
+            player.setheading(DIRS[dir_idx])
+            player.lives = lives
+            self.players.append(player)
+        self.seed = 0
+        # Network matches always reset the grid after a crash
+        self.derez = False
+        self.playback = None
+        # Bots only run on the server
+        self.decisions = None
+        self.crashed = []
+        self.game_on = True
+        self.tick = 0
+        self.round = 0
+        self.winner = None
+        # Tick the next input is stamped with
+        self.input_tick = 0
+
+    def local_player(self):
+        return self.players[self.player_idx]
+
+    def send_input(self):
+        dir = self.local_player().inputs.pop()
+        dir_idx = NO_INPUT if dir is None else DIRS.index(dir)
+        # Never stamp an input for a tick the server has already run
+        self.input_tick = max(self.input_tick, self.tick)
+        try:
+            self.connection.send(INPUT.pack(b"I", self.input_tick, dir_idx))
+        except OSError:
+            self.connection.closed = True
+        self.input_tick += 1
+
+    def apply_tick(self, message):
+        """Applies one tick from the server. Returns the first player that crashed, if
+        any; all of them are in self.crashed."""
+        _, self.tick, flags, winner_idx, count = TICK.unpack_from(message)
+        self.crashed = []
+        for i in range(count):
+            idx, x, y, dir_idx, kind, lives = RECORD.unpack_from(
+                message, TICK.size + i * RECORD.size
+            )
+            player = self.players[idx]
+            player.lives = lives
+            if kind == CRASH:
+                player.crash_pos = (x, y)
+                player.status = player.DEAD if lives == 0 else player.READY
+                self.crashed.append(player)
+                continue
+            player.setposition(x, y)
+            player.setheading(DIRS[dir_idx])
+            player.status = player.READY
+        if flags & ROUND_RESET:
+            self.round += 1
+        if flags & GAME_OVER:
+            self.game_on = False
+            if winner_idx != NO_WINNER:
+                self.winner = self.players[winner_idx]
+        return self.crashed[0] if self.crashed else None
+
+    def step(self, timeout=0):
+        """Sends this tick's input, then applies every tick the server has sent since
+        the last step, waiting up to timeout seconds for the first. Returns the first
+        player that crashed in them, if any; all of them are in self.crashed."""
+        if not self.game_on:
+            return None
+        self.send_input()
+        crashed = []
+        message = self.connection.receive(timeout)
+        while message is not None:
+            self.apply_tick(message)
+            crashed += self.crashed
+            if not self.game_on:
+                break
+            message = self.connection.receive(0)
+        if self.connection.closed:
+            self.game_on = False
+        self.crashed = crashed
+        return crashed[0] if crashed else None
+
+    def get_winner(self):
+        return self.winner
+
+    def close(self):
+        self.connection.close()
+
+
+def accept_clients(port, count, host=""):
+    """Listens on port until count clients have connected."""
+    listener = socket.create_server((host, port))
+    connections = []
+    while len(connections) < count:
+        sock, address = listener.accept()
+        print(f"P{len(connections) + 1} connected from {address[0]}")
+        connections.append(Connection(sock))
+    listener.close()
+    return connections
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    modes = parser.add_subparsers(dest="mode", required=True)
+    server = modes.add_parser("server", help="host a match")
+    server.add_argument("--port", type=int, default=DEFAULT_PORT)
+    server.add_argument("--clients", type=int, default=2)
+    server.add_argument("--bots", type=int, default=0)
+    server.add_argument("--difficulty", type=int, default=2)
+    server.add_argument("--grid_size", type=int, default=2)
+    server.add_argument("--seed", type=int)
+    client = modes.add_parser("client", help="join a match")
+    client.add_argument("--host", default="localhost")
+    client.add_argument("--port", type=int, default=DEFAULT_PORT)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.mode == "server":
+        engine = Engine(
+            grid_size=args.grid_size,
+            humans=args.clients,
+            bots=args.bots,
+            difficulty=args.difficulty,
+            seed=args.seed,
+        )
+        print(f"Waiting for {args.clients} clients on port {args.port}")
+        server = Server(engine, accept_clients(args.port, args.clients))
+        winner = server.run()
+        print(f"{engine.tick} ticks, winner {winner.name if winner else 'none'}")
+        print(f"{server.bytes_sent / max(engine.tick, 1):.1f} bytes per tick per client")
+        return
+
+    import turtle
+    from game import Game
+
+    remote = RemoteEngine(args.host, args.port)
+    gameObj = Game(engine=remote, testing=True)
+    gameObj.start_game()
+    # Any client can use the P1 keys
+    gameObj.key_mapper(remote.local_player(), **constants.KEY_BINDINGS[0])
+    turtle.mainloop()
+    remote.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -12,8 +12,8 @@ defaults = {
     "difficulty": {
         "value": 1,
         "min": 1,
-        "max": 3,
-        "labels": ["Easy", "Normal", "Hard"],
+        "max": 5,
+        "labels": ["Easy", "Normal", "Hard", "Expert", "Master"],
     },
 }
 
@@ -1,34 +1,83 @@
-import turtle
+import math
 import random
+from array import array
 
 
-class Particle(turtle.Turtle):
-    """This class is used to create particle effects when there is a crash."""
+class ParticleSystem:
+    """Crash particle effects. Positions, velocities and lifetimes live in flat arrays
+    and are updated in one pass per tick. move costs nothing while no explosion is
+    active. Drawing is optional, so particles also run without a display."""
 
-    def __init__(self):
-        super().__init__(shape="square")
-        self.shapesize(stretch_wid=0.1, stretch_len=0.3, outline=None)
-        self.speed(0)  # Refers to animation speed
-        self.penup()
-        self.fwd_speed = 10
-        self.hideturtle()
-        self.frame = 0
+    def __init__(self, count=20, rng=random, screen=None, fwd_speed=10, lifetime=10):
+        self.count = count
+        self.rng = rng
+        self.fwd_speed = fwd_speed
+        self.lifetime = lifetime
+        self.xs = array("d", bytes(8 * count))
+        self.ys = array("d", bytes(8 * count))
+        self.vxs = array("d", bytes(8 * count))
+        self.vys = array("d", bytes(8 * count))
+        self.frames = array("i", bytes(4 * count))
+        self.active = 0
+        self.renderer = ParticleRenderer(screen, count) if screen else None
 
-    def explode(self, start_x, start_y):
-        self.frame = 1
-        self.showturtle()
-        self.setposition(start_x, start_y)
-        self.setheading(random.randint(0, 360))
+    def explode(self, start_x, start_y, color):
+        """Sends every particle flying from start_x, start_y in a random direction."""
+        for i in range(self.count):
+            angle = math.radians(self.rng.randint(0, 360))
+            self.xs[i] = start_x
+            self.ys[i] = start_y
+            self.vxs[i] = math.cos(angle) * self.fwd_speed
+            self.vys[i] = math.sin(angle) * self.fwd_speed
+            self.frames[i] = self.lifetime
+        self.active = self.count
+        if self.renderer:
+            self.renderer.show(color)
 
     def move(self):
-        if self.frame > 0:
-            self.forward(self.fwd_speed)
-            self.frame += 1
-        if self.frame > 10:
-            self.frame = 0
-            self.hideturtle()
-            self.setposition(0, 0)
-
-    def change_color(self, player):
-        pencolor, fillcolor = player.color()
-        self.color(pencolor, "black")
+        if not self.active:
+            return
+        xs, ys, vxs, vys, frames = self.xs, self.ys, self.vxs, self.vys, self.frames
+        for i in range(self.count):
+            if frames[i]:
+                xs[i] += vxs[i]
+                ys[i] += vys[i]
+                frames[i] -= 1
+                if not frames[i]:
+                    self.active -= 1
+        if self.renderer:
+            self.renderer.draw(self)
+
+
+class ParticleRenderer:
+    """Fixed pool of short canvas lines, one per particle, hidden while idle."""
+
+    def __init__(self, screen, count, length=6, width=2):
+        self.canvas = screen.getcanvas()
+        self.xscale = screen.xscale
+        self.yscale = screen.yscale
+        self.length = length
+        self.items = [
+            self.canvas.create_line(0, 0, 0, 0, width=width, state="hidden")
+            for _ in range(count)
+        ]
+
+    def show(self, color):
+        for item in self.items:
+            self.canvas.itemconfigure(item, fill=color, state="normal")
+
+    def draw(self, particles):
+        scale = self.length / particles.fwd_speed
+        for i, item in enumerate(self.items):
+            if particles.frames[i]:
+                x = particles.xs[i] * self.xscale
+                y = -particles.ys[i] * self.yscale
+                self.canvas.coords(
+                    item,
+                    x,
+                    y,
+                    x + particles.vxs[i] * scale * self.xscale,
+                    y - particles.vys[i] * scale * self.yscale,
+                )
+            else:
+                self.canvas.itemconfigure(item, state="hidden")
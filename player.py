@@ -1,40 +1,73 @@
-import turtle
 import random
 import constants
+from inputs import InputQueue
 
 
-class Player(turtle.Turtle):
+class Player:
+    """Light cycle state and movement rules. Drawing is handled by Lightcycle, so a
+    player can be simulated without a display."""
 
     CRASHED = "crashed"
     READY = "ready"
     DEAD = "dead"
 
-    def __init__(self, name, start_x, start_y, color):
-        super(Player, self).__init__()
-        self.penup()
-        self.shape("square")
-        self.color(color)
-        self.shapesize(stretch_wid=0.2, stretch_len=0.8, outline=None)
+    def __init__(self, name, start_x, start_y, color, rng=random):
         self.name = name
-        self.speed(0)
+        # Source of random headings, seeded by the engine so matches can be replayed
+        self.rng = rng
+        self.color = color
         self.fwd_speed = 1
-        self.pensize(3)
-        self.setheading(random.randrange(0, 360, 90))
+        self.direction = self.rng.randrange(0, 360, 90)
         self.setposition(start_x, start_y)
         self.prev_pos = (start_x, start_y)
+        self.crash_pos = None
+        self.crash_cause = None
         self.lives = 3
         self.status = self.READY
         self.is_ai = False
-        self.pendown()
+        # Called with (player, dir) on every go_dir, used to record replays
+        self.on_input = None
+        # Keypresses waiting for the next tick
+        self.inputs = InputQueue()
+        # Value this player's cells hold in the grid, set by the engine
+        self.owner_id = 1
+        # Rectangles of grid cells this player marked, [x0, y0, x1, y1] inclusive
+        self.trail = []
+
+    def heading(self):
+        return self.direction
+
+    def setheading(self, dir):
+        self.direction = dir % 360
+
+    def xcor(self):
+        return self.x
+
+    def ycor(self):
+        return self.y
+
+    def position(self):
+        return (self.x, self.y)
+
+    def setposition(self, x, y):
+        self.x = x
+        self.y = y
+
+    def forward(self, distance):
+        dx, dy = constants.DELTAS[self.direction]
+        self.x += dx * distance
+        self.y += dy * distance
 
     def turn_left(self):
-        self.left(90)
+        self.setheading(self.direction + 90)
 
     def turn_right(self):
-        self.right(90)
+        self.setheading(self.direction - 90)
 
     def go_dir(self, dir):
         """Determine movement based on current heading."""
+        if self.on_input:
+            self.on_input(self, dir)
         opposite_dir = constants.OPPOSING_DIRS[dir]
         if self.heading() == dir:
             self.accelerate()
@@ -44,16 +77,14 @@ class Player(turtle.Turtle):
             self.setheading(dir)
 
     def accelerate(self):
-        """Min. speed = 1, Max. speed = 3."""
+        """Min. speed = 1, Max. speed = 3. The new speed applies from the next move."""
         if self.fwd_speed < 3:
             self.fwd_speed += 1
-            self.forward(self.fwd_speed)
 
     def decelerate(self):
         """Min. speed = 1, therefore player can never stop"""
         if self.fwd_speed > 1:
             self.fwd_speed -= 1
-            self.forward(self.fwd_speed)
 
     def set_prev_coord(self):
         """Sets prev coordinates."""
@@ -63,19 +94,22 @@ class Player(turtle.Turtle):
 
     def is_collision(self, grid, x, y):
         """Checks for any visited coordinate and if the coordinate is out of bounds."""
-        if x < 0 or y < 0:
-            return True
-        try:
-            return grid.matrix[y][x]
-        except IndexError:
-            # Out of Bounds
-            return True
-
-    def clear_lightcycle(self):
-        """Removes light cycle from screen"""
-        self.hideturtle()
-        self.penup()
-        self.clear()
+        return grid.is_visited(x, y)
+
+    def add_trail(self, x0, y0, x1, y1):
+        """Records a rectangle of marked grid cells. While the heading holds, each new
+        rectangle extends the last one, so there is one rectangle per straight run."""
+        if self.trail:
+            last = self.trail[-1]
+            if last[1] == y0 and last[3] == y1 and x0 <= last[2] + 1 and x1 >= last[0] - 1:
+                last[0] = min(last[0], x0)
+                last[2] = max(last[2], x1)
+                return
+            if last[0] == x0 and last[2] == x1 and y0 <= last[3] + 1 and y1 >= last[1] - 1:
+                last[1] = min(last[1], y0)
+                last[3] = max(last[3], y1)
+                return
+        self.trail.append([x0, y0, x1, y1])
 
     def lose_life(self):
         """Take away one life from player"""
@@ -88,8 +122,7 @@ class Player(turtle.Turtle):
         resets the position list."""
         self.status = self.READY
         self.setposition(x, y)
-        self.setheading(random.randrange(0, 360, 90))
+        self.setheading(self.rng.randrange(0, 360, 90))
         self.set_prev_coord()
         self.fwd_speed = 1
-        self.showturtle()
-        self.pendown()
+        self.inputs.clear()
@@ -0,0 +1,174 @@
+import collections
+import csv
+import json
+import time
+
+# Phases in the order they happen during a tick and frame
+PHASES = [
+    "ai",
+    "movement",
+    "position_range_adder",
+    "analyze_positions",
+    "particles",
+    "score",
+    "render",
+]
+COUNTERS = ["cells_scanned", "cells_stamped"]
+
+
+class TickProfiler:
+    """Times each phase of every tick and counts the grid cells checked and marked.
+    Methods are wrapped in place, so nothing is measured unless a profiler is attached.
+    Phase times are exclusive: movement does not include the nested
+    position_range_adder and analyze_positions calls. A frame's render time goes to
+    the last tick before it."""
+
+    def __init__(self, window=240):
+        self.rows = []
+        self.row = None
+        self.tick_start = None
+        self.nested = []
+        # Depth of counted calls, so grid calls made inside one are not counted twice
+        self.counting = 0
+        # Rolling samples for the HUD
+        self.tick_times = collections.deque(maxlen=window)
+        self.frame_times = collections.deque(maxlen=window)
+        self.phase_totals = collections.deque(maxlen=window)
+
+    def timed(self, func, name):
+        """Wraps func so its running time, minus any timed calls inside it, is added
+        to the current tick's phase name."""
+
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            self.nested.append(0.0)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                inner = self.nested.pop()
+                if self.nested:
+                    self.nested[-1] += elapsed
+                if self.row is not None:
+                    self.row[name] += elapsed - inner
+
+        return wrapper
+
+    def counted(self, func, counts):
+        """Wraps func so counts(args, result), a dict of counter increments, is added to
+        the current tick's counters. Calls made inside a counted call are not counted."""
+
+        def wrapper(*args):
+            self.counting += 1
+            try:
+                result = func(*args)
+            finally:
+                self.counting -= 1
+            if self.row is not None and not self.counting:
+                for name, cells in counts(args, result).items():
+                    self.row[name] += cells
+            return result
+
+        return wrapper
+
+    def instrument_engine(self, engine):
+        engine.move_player = self.timed(engine.move_player, "movement")
+        engine.resolve_moves = self.timed(engine.resolve_moves, "movement")
+        engine.position_range_adder = self.timed(
+            engine.position_range_adder, "position_range_adder"
+        )
+        engine.analyze_positions = self.timed(
+            engine.analyze_positions, "analyze_positions"
+        )
+        for player in engine.players:
+            if player.is_ai:
+                player.run_ai_logic = self.timed(player.run_ai_logic, "ai")
+        if engine.decisions:
+            engine.decisions.decide = self.timed(engine.decisions.decide, "ai")
+
+        # Every path counts one cell read per position checked, and the band of
+        # 2 * amount + 1 cells marked across each clear position, which includes the
+        # position itself. The cell by cell path and a sweep count the same run alike.
+        grid = engine.grid
+        if engine.vectorized:
+            # A sweep reads up to the first hit and marks a band around each clear cell
+            grid.sweep = self.counted(
+                grid.sweep,
+                lambda args, count: {
+                    "cells_scanned": min(count + 1, len(args[0])),
+                    "cells_stamped": count * (2 * args[2] + 1),
+                },
+            )
+        # Used on every path: per cell checks, and simultaneous moves
+        grid.is_visited = self.counted(
+            grid.is_visited, lambda args, result: {"cells_scanned": 1}
+        )
+        grid.set_adjacent_coords_as_visited = self.counted(
+            grid.set_adjacent_coords_as_visited,
+            lambda args, result: {"cells_stamped": 2 * args[3] + 1},
+        )
+
+    def begin_tick(self, tick):
+        self.close_row()
+        self.row = dict.fromkeys(PHASES + COUNTERS, 0)
+        self.row["tick"] = tick
+        self.tick_start = time.perf_counter()
+
+    def end_tick(self):
+        self.row["tick_time"] = time.perf_counter() - self.tick_start
+        self.tick_times.append(self.row["tick_time"])
+
+    def end_frame(self):
+        self.frame_times.append(time.perf_counter())
+
+    def close_row(self):
+        if self.row is not None and "tick_time" in self.row:
+            self.rows.append(self.row)
+            self.phase_totals.append({name: self.row[name] for name in PHASES})
+        self.row = None
+
+    def fps(self):
+        if len(self.frame_times) < 2:
+            return 0
+        return (len(self.frame_times) - 1) / (self.frame_times[-1] - self.frame_times[0])
+
+    def tick_p99(self):
+        if not self.tick_times:
+            return 0
+        ordered = sorted(self.tick_times)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+    def slowest_phase(self):
+        totals = dict.fromkeys(PHASES, 0)
+        for row in self.phase_totals:
+            for name in PHASES:
+                totals[name] += row[name]
+        return max(totals, key=totals.get)
+
+    def summary(self):
+        """One line for the HUD."""
+        return (
+            f"FPS {self.fps():.0f}  tick p99 {self.tick_p99() * 1000:.2f} ms  "
+            f"slowest {self.slowest_phase()}"
+        )
+
+    def save(self, path):
+        """Writes one row per tick, times in ms. JSON if path ends in .json, else CSV."""
+        self.close_row()
+        fields = ["tick", "tick_time"] + PHASES + COUNTERS
+        rows = [
+            {
+                name: round(row[name] * 1000, 4)
+                if name not in COUNTERS + ["tick"]
+                else row[name]
+                for name in fields
+            }
+            for row in self.rows
+        ]
+        with open(path, "w", newline="") as f:
+            if path.endswith(".json"):
+                json.dump(rows, f)
+            else:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(rows)
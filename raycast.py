@@ -0,0 +1,138 @@
+from bisect import bisect_left, bisect_right
+
+import constants
+
+
+class IntervalSet:
+    """Sorted, non-overlapping inclusive intervals of occupied cells along one line."""
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+
+    def add(self, low, high):
+        """Marks low..high as occupied, merging with overlapping or touching intervals."""
+        starts = self.starts
+        ends = self.ends
+        i = bisect_left(ends, low - 1)
+        j = bisect_right(starts, high + 1, i)
+        if j == i + 1:
+            # Common case, grows a single existing interval in place
+            if low < starts[i]:
+                starts[i] = low
+            if high > ends[i]:
+                ends[i] = high
+        elif j == i:
+            starts.insert(i, low)
+            ends.insert(i, high)
+        else:
+            starts[i:j] = [min(low, starts[i])]
+            ends[i:j] = [max(high, ends[j - 1])]
+
+    def remove(self, low, high):
+        """Marks low..high as free, trimming or splitting intervals that overlap it."""
+        starts = self.starts
+        ends = self.ends
+        i = bisect_left(ends, low)
+        j = bisect_right(starts, high, i)
+        if i == j:
+            return
+        kept_starts = []
+        kept_ends = []
+        if starts[i] < low:
+            kept_starts.append(starts[i])
+            kept_ends.append(low - 1)
+        if ends[j - 1] > high:
+            kept_starts.append(high + 1)
+            kept_ends.append(ends[j - 1])
+        starts[i:j] = kept_starts
+        ends[i:j] = kept_ends
+
+    def contains(self, value):
+        i = bisect_right(self.starts, value) - 1
+        return i >= 0 and self.ends[i] >= value
+
+    def next_at_or_after(self, value):
+        """Returns the first occupied value >= value, or None."""
+        i = bisect_left(self.ends, value)
+        if i == len(self.ends):
+            return None
+        return max(self.starts[i], value)
+
+    def prev_at_or_before(self, value):
+        """Returns the last occupied value <= value, or None."""
+        i = bisect_right(self.starts, value) - 1
+        if i < 0:
+            return None
+        return min(self.ends[i], value)
+
+
+class RayIndex:
+    """Per-row and per-column interval sets of visited cells, kept up to date as cells
+    are marked. Finds the distance to the next obstacle in any heading in O(log n)."""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        # Only rows and columns that have been marked are stored
+        self.rows = {}
+        self.cols = {}
+
+    def clear(self):
+        self.rows.clear()
+        self.cols.clear()
+
+    def mark_rect(self, x0, y0, x1, y1):
+        """Marks every cell in the inclusive rectangle. Must be inside the grid."""
+        for y in range(y0, y1 + 1):
+            row = self.rows.get(y)
+            if row is None:
+                row = self.rows[y] = IntervalSet()
+            row.add(x0, x1)
+        for x in range(x0, x1 + 1):
+            col = self.cols.get(x)
+            if col is None:
+                col = self.cols[x] = IntervalSet()
+            col.add(y0, y1)
+
+    def unmark_rect(self, x0, y0, x1, y1):
+        """Marks every cell in the inclusive rectangle as free."""
+        for lines, first, last, low, high in (
+            (self.rows, y0, y1, x0, x1),
+            (self.cols, x0, x1, y0, y1),
+        ):
+            for i in range(first, last + 1):
+                line = lines.get(i)
+                if line is not None:
+                    line.remove(low, high)
+                    if not line.starts:
+                        del lines[i]
+
+    def distance(self, x, y, heading):
+        """Returns the smallest i >= 1 where the cell i steps away in heading is visited
+        or out of bounds."""
+        dx, dy = constants.DELTAS[heading]
+        next_x, next_y = x + dx, y + dy
+        if not (0 <= next_x < self.width and 0 <= next_y < self.height):
+            return 1
+
+        if heading == constants.EAST:
+            wall = self.width - x
+            line = self.rows.get(y)
+            hit = line.next_at_or_after(next_x) if line else None
+            return wall if hit is None else hit - x
+        elif heading == constants.WEST:
+            wall = x + 1
+            line = self.rows.get(y)
+            hit = line.prev_at_or_before(next_x) if line else None
+            return wall if hit is None else x - hit
+        elif heading == constants.NORTH:
+            wall = self.height - y
+            line = self.cols.get(x)
+            hit = line.next_at_or_after(next_y) if line else None
+            return wall if hit is None else hit - y
+        else:
+            wall = y + 1
+            line = self.cols.get(x)
+            hit = line.prev_at_or_before(next_y) if line else None
+            return wall if hit is None else y - hit
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""Records matches as compact, deterministic replays and plays them back.
+
+    $ python3 replay.py match.trr              # watch at normal speed
+    $ python3 replay.py match.trr --speed 4    # watch at 4x
+    $ python3 replay.py match.trr --headless   # re-simulate as fast as possible
+
+A replay holds the engine seed, the match settings and every input (human key
+presses and bot decisions) with the tick it was applied on. Stretches of ticks with
+no input are stored as a single run length, so a long match stays a few KB.
+"""
+import argparse
+import struct
+import sys
+import time
+import constants
+
+from engine import Engine
+
+MAGIC = b"TRNR"
+# Version 2: speed changes no longer move the player outside the tick
+# Version 3: adds the flags byte
+VERSION = 3
+# Magic, version, seed, grid size, humans, flags, bots
+HEADER = struct.Struct(">4sBQBBBB")
+# Flags
+DEREZ = 1
+SIMULTANEOUS = 2
+TICKS = struct.Struct(">I")
+# An event is one byte, the player index above the 2 bit direction
+MAX_PLAYERS = 64
+DIRS = [constants.EAST, constants.NORTH, constants.WEST, constants.SOUTH]
+
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class Replay:
+    """Everything needed to re-simulate a match. events is a list of
+    (tick, player index, dir) in the order they were applied."""
+
+    def __init__(
+        self,
+        seed,
+        grid_size,
+        humans,
+        difficulties,
+        ticks=0,
+        events=None,
+        derez=False,
+        simultaneous=False,
+    ):
+        self.seed = seed
+        self.grid_size = grid_size
+        self.humans = humans
+        self.derez = derez
+        self.simultaneous = simultaneous
+        self.difficulties = difficulties
+        self.ticks = ticks
+        self.events = events if events is not None else []
+
+    @classmethod
+    def from_engine(cls, engine):
+        difficulties = [player.difficulty for player in engine.players if player.is_ai]
+        return cls(
+            engine.seed,
+            engine.grid_size,
+            engine.humans,
+            difficulties,
+            derez=engine.derez,
+            simultaneous=engine.simultaneous,
+        )
+
+    def create_engine(self):
+        """Returns a fresh engine in the same starting state as the recorded match."""
+        engine = Engine(
+            grid_size=self.grid_size,
+            humans=self.humans,
+            bots=0,
+            seed=self.seed,
+            derez=self.derez,
+            simultaneous=self.simultaneous,
+        )
+        for i, difficulty in enumerate(self.difficulties):
+            engine.add_ai("COM" + str(i + 1), difficulty)
+        engine.playback = Playback(self)
+        return engine
+
+    def to_bytes(self):
+        out = bytearray(
+            HEADER.pack(
+                MAGIC,
+                VERSION,
+                self.seed,
+                self.grid_size,
+                self.humans,
+                (DEREZ if self.derez else 0)
+                | (SIMULTANEOUS if self.simultaneous else 0),
+                len(self.difficulties),
+            )
+        )
+        out += bytes(self.difficulties)
+        out += TICKS.pack(self.ticks)
+        last_tick = 0
+        for tick, idx, dir in self.events:
+            # Run of ticks without input, then the input itself
+            write_varint(out, tick - last_tick)
+            out.append(idx << 2 | DIRS.index(dir))
+            last_tick = tick
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, seed, grid_size, humans, flags, bots = HEADER.unpack_from(
+            data
+        )
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a TurtleTron replay")
+        pos = HEADER.size
+        difficulties = list(data[pos : pos + bots])
+        pos += bots
+        (ticks,) = TICKS.unpack_from(data, pos)
+        pos += TICKS.size
+        events = []
+        tick = 0
+        while pos < len(data):
+            gap, pos = read_varint(data, pos)
+            tick += gap
+            events.append((tick, data[pos] >> 2, DIRS[data[pos] & 3]))
+            pos += 1
+        return cls(
+            seed,
+            grid_size,
+            humans,
+            difficulties,
+            ticks,
+            events,
+            bool(flags & DEREZ),
+            bool(flags & SIMULTANEOUS),
+        )
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+class Recorder:
+    """Captures every go_dir call on the engine's players into a Replay."""
+
+    def __init__(self, engine):
+        if len(engine.players) > MAX_PLAYERS:
+            raise ValueError(f"Replays hold at most {MAX_PLAYERS} players")
+        self.engine = engine
+        self.replay = Replay.from_engine(engine)
+        self.player_idx = {id(player): i for i, player in enumerate(engine.players)}
+        engine.recorder = self
+        for player in engine.players:
+            player.on_input = self.record
+
+    def record(self, player, dir):
+        self.replay.events.append((self.engine.tick, self.player_idx[id(player)], dir))
+
+    def finish(self):
+        """Returns the replay, complete up to the current tick."""
+        self.replay.ticks = self.engine.tick
+        return self.replay
+
+
+class Playback:
+    """Feeds recorded inputs into an engine at the start of each tick. While an engine
+    has a playback, its bots do not make their own decisions."""
+
+    def __init__(self, replay):
+        self.events = replay.events
+        self.ticks = replay.ticks
+        self.next_event = 0
+
+    def is_finished(self, engine):
+        return engine.tick >= self.ticks
+
+    def apply_inputs(self, engine):
+        while (
+            self.next_event < len(self.events)
+            and self.events[self.next_event][0] <= engine.tick
+        ):
+            tick, idx, dir = self.events[self.next_event]
+            engine.players[idx].go_dir(dir)
+            self.next_event += 1
+
+
+def simulate(replay):
+    """Re-runs a replay headless as fast as possible. Returns the finished engine."""
+    engine = replay.create_engine()
+    while engine.game_on and not engine.playback.is_finished(engine):
+        engine.step()
+    return engine
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument(
+        "--headless", action="store_true", help="simulate without a window"
+    )
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="playback rate, 2 is twice as fast"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    replay = Replay.load(args.path)
+    if args.headless:
+        start = time.perf_counter()
+        engine = simulate(replay)
+        elapsed = time.perf_counter() - start
+        winner = engine.get_winner()
+        print(
+            f"{engine.tick} ticks, {engine.round} rounds, "
+            f"winner {winner.name if winner else 'none'}, "
+            f"{engine.tick / elapsed:.0f} ticks/s"
+        )
+        for player in engine.players:
+            print(f"{player.name}: {player.lives} lives, {player.status}")
+        return
+
+    import turtle
+    from game import Game
+
+    gameObj = Game(
+        engine=replay.create_engine(),
+        testing=True,
+        tick_rate=constants.TICK_RATE * args.speed,
+    )
+    gameObj.start_game()
+    turtle.mainloop()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,50 @@
+import time
+
+
+class Scheduler:
+    """Fixed timestep clock for the game loop. Ticks run at tick_rate no matter how fast
+    the machine is, frames are drawn at render_rate. When drawing falls behind, up to
+    max_catch_up ticks run back to back before the next frame and the rest are dropped."""
+
+    def __init__(self, tick_rate=60, render_rate=60, max_catch_up=5):
+        self.tick_interval = 1 / tick_rate
+        self.render_interval = 1 / render_rate
+        self.max_catch_up = max_catch_up
+        self.next_tick = None
+        self.next_render = None
+
+    def clock(self):
+        return time.monotonic()
+
+    def start(self):
+        now = self.clock()
+        self.next_tick = now
+        self.next_render = now
+
+    def ticks_due(self, now):
+        """Returns how many ticks to run now, at most max_catch_up."""
+        ticks = 0
+        while self.next_tick <= now and ticks < self.max_catch_up:
+            self.next_tick += self.tick_interval
+            ticks += 1
+        if self.next_tick <= now:
+            # Too far behind, drop the backlog instead of spiralling
+            self.next_tick = now + self.tick_interval
+        return ticks
+
+    def render_due(self, now):
+        """Returns True if a frame should be drawn now."""
+        if now < self.next_render:
+            return False
+        self.next_render += self.render_interval
+        if self.next_render <= now:
+            self.next_render = now + self.render_interval
+        return True
+
+    def delay(self):
+        """Seconds until the next tick or frame is due."""
+        return max(min(self.next_tick, self.next_render) - self.clock(), 0)
+
+    def wait(self):
+        """Sleeps until the next tick or frame is due."""
+        time.sleep(self.delay())
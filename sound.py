@@ -1,26 +1,258 @@
 import os
+import queue
+import shutil
+import subprocess
+import threading
+
+SOUNDS_DIR = "sounds"
+
+
+class NullBackend:
+    """Plays nothing. Used on machines without audio and for headless runs."""
+
+    enabled = False
+
+    def play(self, name, path, data, music=False):
+        pass
+
+    def stop_music(self):
+        pass
+
+    def speak(self, text):
+        pass
+
+
+class RecordingBackend(NullBackend):
+    """Plays nothing but keeps a list of every command it was sent."""
+
+    enabled = True
+
+    def __init__(self):
+        self.calls = []
+
+    def play(self, name, path, data, music=False):
+        self.calls.append(("play", name, music))
+
+    def stop_music(self):
+        self.calls.append(("stop_music",))
+
+    def speak(self, text):
+        self.calls.append(("speak", text))
+
+
+class ProcessBackend(NullBackend):
+    """Plays clips with a command line player. Music runs in its own process so it can
+    be stopped without killing every other sound. Players that read from stdin are fed
+    the clip loaded at startup instead of reopening the file."""
+
+    enabled = True
+    player = []
+    stdin_player = None
+    speaker = None
+
+    def __init__(self):
+        self.music = None
+
+    def play(self, name, path, data, music=False):
+        if self.stdin_player and not music:
+            process = subprocess.Popen(
+                self.stdin_player, stdin=subprocess.PIPE, stderr=subprocess.DEVNULL
+            )
+            process.stdin.write(data)
+            process.stdin.close()
+            return
+        process = subprocess.Popen(
+            self.player + [path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        if music:
+            self.music = process
+
+    def stop_music(self):
+        if self.music and self.music.poll() is None:
+            self.music.terminate()
+        self.music = None
+
+    def speak(self, text):
+        if self.speaker:
+            subprocess.Popen([self.speaker, text], stdout=subprocess.DEVNULL)
+
+
+class AfplayBackend(ProcessBackend):
+    """macOS."""
+
+    player = ["afplay"]
+    speaker = "say"
+
+
+class AplayBackend(ProcessBackend):
+    """Linux with ALSA."""
+
+    player = ["aplay", "-q"]
+    stdin_player = ["aplay", "-q", "-"]
+    speaker = shutil.which("espeak") and "espeak"
+
+
+class WinsoundBackend(NullBackend):
+    """Windows. winsound can only play one sound at a time, so only music is played."""
+
+    enabled = True
+
+    def __init__(self):
+        import winsound
+
+        self.winsound = winsound
+
+    def play(self, name, path, data, music=False):
+        if music:
+            self.winsound.PlaySound(
+                path, self.winsound.SND_FILENAME | self.winsound.SND_ASYNC
+            )
+
+    def stop_music(self):
+        self.winsound.PlaySound(None, self.winsound.SND_PURGE)
+
+
+BACKENDS = {
+    "null": NullBackend,
+    "afplay": AfplayBackend,
+    "aplay": AplayBackend,
+    "winsound": WinsoundBackend,
+}
+
+
+def default_backend():
+    """Picks a backend for this machine. TURTLETRON_AUDIO overrides it, e.g. null."""
+    name = os.environ.get("TURTLETRON_AUDIO")
+    if name is None:
+        if os.name == "nt":
+            name = "winsound"
+        elif shutil.which("afplay"):
+            name = "afplay"
+        elif shutil.which("aplay"):
+            name = "aplay"
+        else:
+            name = "null"
+    return BACKENDS[name]()
+
+
+def load_clips():
+    """Reads every clip in SOUNDS_DIR once. Returns {name: (path, data)}."""
+    clips = {}
+    if os.path.isdir(SOUNDS_DIR):
+        for filename in os.listdir(SOUNDS_DIR):
+            name, ext = os.path.splitext(filename)
+            if ext == ".wav":
+                path = os.path.join(SOUNDS_DIR, filename)
+                with open(path, "rb") as f:
+                    clips[name] = (path, f.read())
+    return clips
+
+
+class AudioEngine:
+    """Runs a backend on a background thread. Commands go through a bounded queue and
+    are dropped when it is full, so callers never wait on audio."""
+
+    def __init__(self, backend=None, max_pending=16):
+        self.backend = backend or default_backend()
+        self.clips = load_clips()
+        self.commands = queue.Queue(max_pending)
+        self.dropped = 0
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    def submit(self, command, *args):
+        if not self.backend.enabled:
+            return
+        try:
+            self.commands.put_nowait((command, args))
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        while True:
+            command, args = self.commands.get()
+            try:
+                if command == "play":
+                    name, music = args
+                    if name in self.clips:
+                        path, data = self.clips[name]
+                        self.backend.play(name, path, data, music)
+                elif command == "stop_music":
+                    self.backend.stop_music()
+                elif command == "speak":
+                    self.backend.speak(*args)
+                elif command == "close":
+                    self.backend.stop_music()
+                    return
+            except (OSError, ValueError):
+                # Missing player or audio device, keep the game running
+                pass
+            finally:
+                self.commands.task_done()
+
+    def flush(self):
+        """Waits until every queued command has been handled."""
+        self.commands.join()
+
+    def close(self, timeout=1.0):
+        """Stops the music and the worker, after the commands already queued, so no
+        player they start outlives the game. Waits at most timeout seconds, then stops
+        the music from this thread."""
+        try:
+            self.commands.put(("close", ()), timeout=timeout)
+        except queue.Full:
+            pass
+        self.worker.join(timeout)
+        if self.worker.is_alive():
+            try:
+                self.backend.stop_music()
+            except (OSError, ValueError):
+                pass
+
+
+audio_engine = None
+
+
+def get_audio_engine():
+    """The audio engine is shared by every Sound and started on first use."""
+    global audio_engine
+    if audio_engine is None:
+        audio_engine = AudioEngine()
+    return audio_engine
+
+
+def close_audio_engine():
+    """Stops the shared audio engine and its music, if it was started. The worker is a
+    daemon thread, so anything still queued at exit would otherwise be lost."""
+    global audio_engine
+    if audio_engine is not None:
+        audio_engine.close()
+        audio_engine = None
+
+
+def set_backend(backend):
+    """Swaps the backend of the shared audio engine, e.g. RecordingBackend()."""
+    get_audio_engine().flush()
+    get_audio_engine().backend = backend
 
 
 class Sound:
+    """Game and menu audio. Every call only queues a command for the audio engine."""
+
+    def __init__(self):
+        self.engine = get_audio_engine()
+
     def start_music(self, name, is_game_on=False):
         self.stop_music()
-        if os.name == "posix":
-            os.system(f"afplay sounds/{name}.wav&")
-            if is_game_on:
-                os.system("say grid is live!&")
-        elif os.name == "nt":
-            winsound.PlaySound(bgm, winsound.SND_ASYNC)
+        self.engine.submit("play", name, True)
+        if is_game_on:
+            self.speak("grid is live!")
 
     def stop_music(self):
-        if os.name == "posix":
-            os.system("killall afplay")
-        elif os.name == "nt":
-            winsound.PlaySound(None, winsound.SND_PURGE)
+        self.engine.submit("stop_music")
 
     def play_sfx(self, sound):
-        if os.name == "posix":
-            os.system(f"afplay sounds/{sound}.wav&")
-        elif os.name == "nt":
-            # winsound.PlaySound(sound, winsound.SND_ASYNC)
-            # can't play simoutaneous sounds
-            pass
+        self.engine.submit("play", sound, False)
+
+    def speak(self, text):
+        self.engine.submit("speak", text)
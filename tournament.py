@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""Plays headless bot-vs-bot matches in parallel and reports how each difficulty did.
+
+    $ python3 tournament.py --matches 1000 --grid_size 2 --bots 3 --difficulty 1 2 3
+
+Bots are given the listed difficulties in turn, so the example above pits one bot of
+each difficulty against the others in every match.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+
+from engine import Engine
+from mcts import close_pool
+from option_screen import defaults
+from replay import Recorder
+
+
+def play_match(match):
+    """Plays one match in a worker process. Returns a summary dict."""
+    seed, grid_size, difficulties, max_ticks, replay_dir, simultaneous = match
+    random.seed(seed)
+    engine = Engine(
+        grid_size=grid_size, humans=0, bots=0, seed=seed, simultaneous=simultaneous
+    )
+    for i, difficulty in enumerate(difficulties):
+        engine.add_ai("COM" + str(i + 1), difficulty)
+    recorder = Recorder(engine) if replay_dir else None
+
+    crashes = []
+    while engine.game_on and engine.tick < max_ticks:
+        engine.step()
+        for crashed in engine.crashed:
+            crashes.append((crashed.difficulty, crashed.crash_cause))
+
+    if recorder:
+        recorder.finish().save(os.path.join(replay_dir, f"match-{seed}.trr"))
+    winner = engine.get_winner()
+    return {
+        "seed": seed,
+        "ticks": engine.tick,
+        "rounds": engine.round,
+        "winner": winner.difficulty if winner else None,
+        "crashes": crashes,
+    }
+
+
+def summarize(results, difficulties):
+    """Collects win rates, match lengths and crash causes per difficulty."""
+    stats = {
+        difficulty: {
+            "bots": difficulties.count(difficulty),
+            "wins": 0,
+            "win_ticks": 0,
+            "crashes": {},
+        }
+        for difficulty in sorted(set(difficulties))
+    }
+    draws = 0
+    for result in results:
+        if result["winner"] is None:
+            draws += 1
+        else:
+            stats[result["winner"]]["wins"] += 1
+            stats[result["winner"]]["win_ticks"] += result["ticks"]
+        for difficulty, cause in result["crashes"]:
+            causes = stats[difficulty]["crashes"]
+            causes[cause] = causes.get(cause, 0) + 1
+    ticks = [result["ticks"] for result in results]
+    return {
+        "matches": len(results),
+        "draws": draws,
+        "mean_ticks": sum(ticks) / len(ticks),
+        "max_ticks": max(ticks),
+        "difficulties": stats,
+    }
+
+
+def print_report(summary):
+    labels = defaults["difficulty"]["labels"]
+    print(
+        f"{summary['matches']} matches, {summary['draws']} draws, "
+        f"mean length {summary['mean_ticks']:.0f} ticks, "
+        f"longest {summary['max_ticks']} ticks"
+    )
+    print(f"{'difficulty':<14}{'bots':>5}{'wins':>7}{'win %':>8}{'ticks/win':>11}  crashes")
+    for difficulty, stats in summary["difficulties"].items():
+        label = labels[difficulty - 1] if difficulty <= len(labels) else ""
+        name = f"{difficulty} {label}"
+        win_rate = 100 * stats["wins"] / summary["matches"]
+        win_ticks = stats["win_ticks"] / stats["wins"] if stats["wins"] else 0
+        crashes = ", ".join(
+            f"{cause}: {count}" for cause, count in sorted(stats["crashes"].items())
+        )
+        print(
+            f"{name:<14}{stats['bots']:>5}{stats['wins']:>7}{win_rate:>7.1f}%"
+            f"{win_ticks:>11.0f}  {crashes}"
+        )
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--matches", type=int, default=100)
+    parser.add_argument(
+        "--grid_size",
+        type=int,
+        default=defaults["grid_size"]["value"],
+        choices=range(defaults["grid_size"]["min"], defaults["grid_size"]["max"] + 1),
+    )
+    parser.add_argument(
+        "--bots", type=int, default=2, help="bots per match, at least 2"
+    )
+    parser.add_argument(
+        "--difficulty",
+        type=int,
+        nargs="+",
+        default=[defaults["difficulty"]["value"]],
+        help="difficulties handed out to the bots in turn",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="defaults to the number of cores"
+    )
+    parser.add_argument(
+        "--max_ticks",
+        type=int,
+        default=200000,
+        help="matches still running after this many ticks count as draws",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--simultaneous",
+        action="store_true",
+        help="move every bot at once, so head-on crashes are draws",
+    )
+    parser.add_argument(
+        "--replays", help="save a replay of every match into this directory"
+    )
+    args = parser.parse_args(argv)
+    if args.bots < 2:
+        parser.error("--bots must be at least 2")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    difficulties = [
+        args.difficulty[i % len(args.difficulty)] for i in range(args.bots)
+    ]
+    matches = [
+        (
+            args.seed + i,
+            args.grid_size,
+            difficulties,
+            args.max_ticks,
+            args.replays,
+            args.simultaneous,
+        )
+        for i in range(args.matches)
+    ]
+    if args.replays:
+        os.makedirs(args.replays, exist_ok=True)
+    with multiprocessing.Pool(args.workers) as pool:
+        results = pool.map(play_match, matches, chunksize=1)
+    close_pool()
+    print_report(summarize(results, difficulties))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
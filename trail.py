@@ -0,0 +1,55 @@
+class Trail:
+    """Draws a light cycle's trail straight onto the turtle canvas. Each straight
+    segment is a single line item whose end point is moved while the heading holds, and
+    a turn starts a new item, so the number of canvas items grows with turns rather than
+    with distance travelled. All items share a tag so the trail clears in one call."""
+
+    def __init__(self, screen, color, width=3):
+        self.canvas = screen.getcanvas()
+        self.xscale = screen.xscale
+        self.yscale = screen.yscale
+        self.color = color
+        self.width = width
+        self.tag = f"trail{id(self)}"
+        self.item = None
+        self.heading = None
+        self.start_pos = None
+        self.end_pos = None
+
+    def to_canvas(self, x, y):
+        return (x * self.xscale, -y * self.yscale)
+
+    def start(self, x, y):
+        """Begins a new trail at x, y without drawing."""
+        self.item = None
+        self.heading = None
+        self.end_pos = (x, y)
+
+    def extend(self, x, y, heading):
+        """Draws from the last point to x, y."""
+        if (x, y) == self.end_pos:
+            return
+        if self.item is None or heading != self.heading:
+            # Turned, start a new segment at the corner
+            self.start_pos = self.end_pos
+            self.item = self.canvas.create_line(
+                *self.to_canvas(*self.start_pos),
+                *self.to_canvas(x, y),
+                fill=self.color,
+                width=self.width,
+                capstyle="projecting",
+                tags=self.tag,
+            )
+            # Keep the light cycles drawn above the trails
+            self.canvas.tag_lower(self.item)
+            self.heading = heading
+        else:
+            self.canvas.coords(
+                self.item, *self.to_canvas(*self.start_pos), *self.to_canvas(x, y)
+            )
+        self.end_pos = (x, y)
+
+    def clear(self):
+        self.canvas.delete(self.tag)
+        self.item = None
+        self.heading = None
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""Steps many bot-only matches at once with numpy. Requires numpy.
+
+    $ python3 vector_engine.py --games 512 --difficulty 1 3 --ticks 2000
+
+Holds every match in struct-of-arrays form: positions, headings, speeds and lives are
+[games, players] arrays and the grids are one [games, height, width] array. A tick
+runs the same rules as Engine.step with the reactive Ai policy, vectorized across
+matches. Players still move one after another within a tick, as in Engine, so later
+players see the cells earlier ones marked. A finished match records its result and
+restarts in place.
+"""
+import argparse
+import sys
+import time
+
+import numpy
+
+from engine import Engine
+
+# Heading index -> unit step, in the order of replay.DIRS (east, north, west, south)
+DX = numpy.array([1, 0, -1, 0])
+DY = numpy.array([0, 1, 0, -1])
+EAST, NORTH, WEST, SOUTH = range(4)
+# Trails are marked this many cells to each side of the path
+BAND = 5
+# Speed of every bot once a round has been reset without humans, see Engine.reset_grid
+RESET_SPEED = 6
+
+
+class VectorEngine:
+    """games independent matches between len(difficulties) bots."""
+
+    def __init__(self, games=256, difficulties=(2, 2), grid_size=1, seed=None):
+        # Reuse the engine's arena sizes so results compare with Engine
+        layout = Engine(grid_size=grid_size, humans=0, bots=0, seed=0)
+        self.width = layout.grid.width
+        self.height = layout.grid.height
+        self.spawn_margin = 100
+        self.games = games
+        self.players = len(difficulties)
+        self.difficulty = numpy.array(difficulties)
+        self.frame_delay = 30 // self.difficulty
+        self.min_collision_distance = 100 // self.difficulty
+        self.rng = numpy.random.default_rng(seed)
+
+        shape = (games, self.players)
+        # The grids of every game back to back, then one spare cell that takes the
+        # writes of masked out band cells
+        self.flat = numpy.zeros(games * self.height * self.width + 1, dtype=numpy.uint8)
+        self.cells = self.flat[:-1].reshape(games, self.height, self.width)
+        self.x = numpy.zeros(shape, dtype=numpy.int64)
+        self.y = numpy.zeros(shape, dtype=numpy.int64)
+        self.heading = numpy.zeros(shape, dtype=numpy.int64)
+        self.speed = numpy.zeros(shape, dtype=numpy.int64)
+        self.lives = numpy.zeros(shape, dtype=numpy.int64)
+        self.frame = numpy.zeros(shape, dtype=numpy.int64)
+        self.tick = numpy.zeros(games, dtype=numpy.int64)
+        self.round = numpy.zeros(games, dtype=numpy.int64)
+
+        # Results of finished matches
+        self.finished = 0
+        self.wins = numpy.zeros(self.players, dtype=numpy.int64)
+        self.match_ticks = 0
+        self.reset(numpy.ones(games, dtype=bool))
+
+    def reset(self, games):
+        """Starts new matches for the games in the boolean mask."""
+        self.cells[games] = 0
+        self.lives[games] = 3
+        self.speed[games] = self.difficulty
+        self.frame[games] = 0
+        self.tick[games] = 0
+        self.round[games] = 0
+        self.respawn(games[:, None] & (self.lives > 0))
+
+    def respawn(self, mask):
+        """Moves the players in the [games, players] mask to random spots and headings."""
+        count = int(mask.sum())
+        margin = self.spawn_margin
+        self.x[mask] = self.rng.integers(margin, self.width - margin + 1, count)
+        self.y[mask] = self.rng.integers(margin, self.height - margin + 1, count)
+        self.heading[mask] = self.rng.integers(0, 4, count)
+
+    def visited(self, games, x, y):
+        """Like Grid.is_visited for arrays of coordinates in the given games."""
+        inside = (x >= 0) & (x < self.width) & (y >= 0) & (y < self.height)
+        return ~inside | (self.flat[self.flat_index(games, x, y, inside)] != 0)
+
+    def flat_index(self, games, x, y, inside):
+        """Indexes into self.flat, the spare cell wherever inside is False. Gathers
+        and scatters on these are much cheaper than masking out the outside cells."""
+        index = (games * self.height + y) * self.width + x
+        return numpy.where(inside, index, len(self.flat) - 1)
+
+    def raycast(self, games, x, y, heading, limit):
+        """Like Grid.raycast for arrays: steps to the first visited or out of bounds
+        cell, or limit + 1 if there is none within limit steps."""
+        steps = numpy.arange(1, limit + 1)
+        xs = x[:, None] + DX[heading][:, None] * steps
+        ys = y[:, None] + DY[heading][:, None] * steps
+        hits = self.visited(games[:, None], xs, ys)
+        return numpy.where(hits.any(axis=1), hits.argmax(axis=1) + 1, limit + 1)
+
+    def run_ai_logic(self, p, alive):
+        """Ai.run_ai_logic for player p in every game where it is alive."""
+        self.frame[:, p] += alive
+        ready = numpy.flatnonzero(alive & (self.frame[:, p] >= self.frame_delay[p]))
+        if not len(ready):
+            return
+        x, y = self.x[ready, p], self.y[ready, p]
+        heading = self.heading[ready, p]
+        limit = self.min_collision_distance[p]
+        near = self.raycast(ready, x, y, heading, limit) <= limit
+        games, x, y, heading = ready[near], x[near], y[near], heading[near]
+        if not len(games):
+            return
+
+        # Ai.determine_turn: turn to the side with more room
+        horizontal = (heading == EAST) | (heading == WEST)
+        first = numpy.where(horizontal, NORTH, WEST)
+        second = numpy.where(horizontal, SOUTH, EAST)
+        limit = max(self.width, self.height)
+        room_first = self.raycast(games, x, y, first, limit)
+        room_second = self.raycast(games, x, y, second, limit)
+        self.heading[games, p] = numpy.where(room_first <= room_second, second, first)
+        self.frame[games, p] = 0
+
+    def move_player(self, p, alive):
+        """Engine.move_player for player p, one cell at a time like
+        Engine.analyze_positions. Returns the games where p crashed."""
+        games = numpy.flatnonzero(alive)
+        x, y = self.x[games, p], self.y[games, p]
+        heading = self.heading[games, p]
+        speed = self.speed[games, p]
+        dx, dy = DX[heading], DY[heading]
+        horizontal = dx != 0
+        offsets = numpy.arange(-BAND, BAND + 1)
+        crashed = numpy.zeros(len(games), dtype=bool)
+        for i in range(int(speed.max(initial=0))):
+            # Cells from the previous position up to, not including, the new one
+            active = ~crashed & (i < speed)
+            cx, cy = x + dx * i, y + dy * i
+            hit = active & self.visited(games, cx, cy)
+            crashed |= hit
+            active &= ~hit
+
+            # Mark the cell and the band across the path, clipped to the grid
+            bx = cx[:, None] + numpy.where(horizontal[:, None], 0, offsets)
+            by = cy[:, None] + numpy.where(horizontal[:, None], offsets, 0)
+            keep = (
+                active[:, None]
+                & (bx >= 0)
+                & (bx < self.width)
+                & (by >= 0)
+                & (by < self.height)
+            )
+            self.flat[self.flat_index(games[:, None], bx, by, keep)] = 1
+        self.flat[-1] = 0
+        self.x[games, p] = x + dx * speed
+        self.y[games, p] = y + dy * speed
+        return games[crashed]
+
+    def step(self):
+        """Advances every match one tick. Returns the mask of matches that finished
+        this tick; they have already been restarted."""
+        crashed = numpy.zeros((self.games, self.players), dtype=bool)
+        for p in range(self.players):
+            alive = (self.lives[:, p] > 0) & ~crashed[:, p]
+            self.run_ai_logic(p, alive)
+            crashed[self.move_player(p, alive), p] = True
+
+        # Engine.step only charges the first player that crashed in a tick
+        any_crash = crashed.any(axis=1)
+        games = numpy.flatnonzero(any_crash)
+        first = crashed[games].argmax(axis=1)
+        self.lives[games, first] -= 1
+
+        over = numpy.zeros(self.games, dtype=bool)
+        over[games] = (self.lives[games] > 0).sum(axis=1) == 1
+        # Engine.reset_grid for the rest: respawn everyone alive on a clear grid
+        resets = any_crash & ~over
+        self.cells[resets] = 0
+        self.respawn(resets[:, None] & (self.lives > 0))
+        self.speed[resets] = RESET_SPEED
+        self.round[resets] += 1
+        self.tick += 1
+
+        if over.any():
+            winners = (self.lives[over] > 0).argmax(axis=1)
+            self.wins += numpy.bincount(winners, minlength=self.players)
+            self.finished += int(over.sum())
+            self.match_ticks += int(self.tick[over].sum())
+            self.reset(over)
+        return over
+
+
+def loop_ticks_per_sec(difficulties, grid_size, ticks, seed):
+    """Game ticks per second of plain Engine matches, for comparison."""
+    engine = None
+    start = time.perf_counter()
+    for _ in range(ticks):
+        if engine is None or not engine.game_on:
+            engine = Engine(grid_size=grid_size, humans=0, bots=0, seed=seed)
+            for i, difficulty in enumerate(difficulties):
+                engine.add_ai("COM" + str(i + 1), difficulty)
+            seed += 1
+        engine.step()
+    return ticks / (time.perf_counter() - start)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=512)
+    parser.add_argument("--grid_size", type=int, default=1)
+    parser.add_argument(
+        "--difficulty",
+        type=int,
+        nargs="+",
+        default=[1, 3],
+        help="one bot per listed difficulty, 1-3",
+    )
+    parser.add_argument("--ticks", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    engine = VectorEngine(args.games, args.difficulty, args.grid_size, args.seed)
+    start = time.perf_counter()
+    for _ in range(args.ticks):
+        engine.step()
+    elapsed = time.perf_counter() - start
+
+    batched = args.games * args.ticks / elapsed
+    loop = loop_ticks_per_sec(args.difficulty, args.grid_size, args.ticks, args.seed)
+    print(f"{args.games} games x {args.ticks} ticks in {elapsed:.1f} s")
+    print(f"{batched:.0f} game ticks/s batched, {loop:.0f} with Engine")
+    print(f"{engine.finished} matches finished", end="")
+    if engine.finished:
+        print(f", {engine.match_ticks / engine.finished:.0f} ticks on average")
+        for p, difficulty in enumerate(args.difficulty):
+            print(f"COM{p + 1} (difficulty {difficulty}): {engine.wins[p]} wins")
+    else:
+        print()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])